@@ -0,0 +1,103 @@
+"""Point d'entrée d'inférence léger
+
+Score des projets à partir des artefacts exportés par ProjectEvaluationPipeline
+(models/inference_model.npz) en n'important que NumPy : ni pandas, ni sklearn,
+ni mlxtend, ni Plotly. Conçu pour les workers de scoring à démarrage à froid.
+
+Usage :
+    python app/inference.py projets.json
+    cat projets.json | python app/inference.py
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import numpy as np
+from utils.schema import CATEGORICAL_COLUMNS, PROJECT_FIELDS
+from utils.scoring_utils import CarbonScorer
+from utils.tree_arrays import load_inference_artifacts
+
+DEFAULT_ARTIFACTS_PATH = 'models/inference_model.npz'
+
+
+class InferenceScorer:
+    def __init__(self, artifacts_path=DEFAULT_ARTIFACTS_PATH):
+        artifacts = load_inference_artifacts(artifacts_path)
+        self.trees = artifacts['trees']
+        self.weights = artifacts['weights']
+        self.feature_names = artifacts['feature_names']
+        self.classes = self.trees[0].classes
+        # Table valeur -> code par variable catégorielle (même ordre que les LabelEncoder)
+        self.code_maps = {
+            col: {value: code for code, value in enumerate(values)}
+            for col, values in artifacts['vocabularies'].items()
+        }
+        self.scorer = CarbonScorer()
+
+        fields = {column: (key, default) for key, column, default in PROJECT_FIELDS}
+        self._feature_sources = [fields[name] for name in self.feature_names]
+
+    def encode(self, projects):
+        """Encode une liste de projets en matrice de features"""
+        X = np.empty((len(projects), len(self.feature_names)), dtype=np.float64)
+        for j, name in enumerate(self.feature_names):
+            key, default = self._feature_sources[j]
+            values = [project.get(key, default) for project in projects]
+            if name in CATEGORICAL_COLUMNS:
+                # Les catégories inconnues prennent le code 0, comme DataPreprocessor
+                code_map = self.code_maps.get(name, {})
+                X[:, j] = [code_map.get(value, 0) for value in values]
+            else:
+                X[:, j] = values
+        return X
+
+    def predict_proba(self, projects):
+        """Probabilités de classe (moyenne pondérée des arbres)"""
+        X = self.encode(projects)
+        probabilities = np.zeros((len(X), len(self.classes)))
+        for tree, weight in zip(self.trees, self.weights):
+            tree_probabilities = tree.predict_proba(X)
+            columns = np.searchsorted(self.classes, tree.classes)
+            probabilities[:, columns] += weight * tree_probabilities
+        return probabilities / self.weights.sum()
+
+    def score(self, projects):
+        """Score carbone, ESG et prédiction du modèle pour chaque projet"""
+        probabilities = self.predict_proba(projects)
+        # Un seul jeu de facteurs pour tout le lot
+        scorer = self.scorer.snapshot()
+        results = []
+        for project, project_probabilities in zip(projects, probabilities):
+            carbon_score = scorer.calculate_carbon_score(project)
+            results.append({
+                'name': project.get('name'),
+                'carbon_score': carbon_score,
+                'carbon_category': scorer.get_carbon_category(carbon_score),
+                'esg_score': scorer.calculate_esg_score(project, carbon_score),
+                'factors_version': scorer.factors_version,
+                'ml_prediction': str(self.classes[np.argmax(project_probabilities)]),
+                'ml_probabilities': dict(zip(self.classes.tolist(), project_probabilities.tolist()))
+            })
+        return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        with open(argv[0], encoding='utf-8') as f:
+            projects = json.load(f)
+    else:
+        projects = json.load(sys.stdin)
+    if isinstance(projects, dict):
+        projects = [projects]
+
+    artifacts_path = os.environ.get('CARBON_INFERENCE_ARTIFACTS', DEFAULT_ARTIFACTS_PATH)
+    results = InferenceScorer(artifacts_path).score(projects)
+    json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
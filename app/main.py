@@ -1,12 +1,17 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import time
 from datetime import datetime
 import io
+from utils.portfolio import PortfolioRollups
+from utils.scoring_utils import CarbonScorer
 
 # Configuration de la page
 st.set_page_config(
@@ -88,83 +93,48 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class CarbonScorer:
-    def __init__(self):
-        # Facteurs d'émission basés sur la Base Carbone ADEME (kg CO2eq)
-        self.energy_factors = {
-            'Renouvelable (solaire, éolien)': 0.05,
-            'Mix énergétique national': 0.3,
-            'Énergie fossile (charbon, gaz)': 0.8
-        }
-        
-        self.transport_factors = {
-            'Transport local (<50km)': 0.1,
-            'Transport régional (50-200km)': 0.3,
-            'Transport national (>200km)': 0.6,
-            'Transport international': 1.0
-        }
-        
-        self.material_factors = {
-            'Matériaux biosourcés (bois, chanvre)': 0.1,
-            'Matériaux recyclés': 0.2,
-            'Matériaux conventionnels': 0.5,
-            'Béton/Acier': 1.0
-        }
-        
-        self.sector_factors = {
-            'Technologie verte': 0.2,
-            'Agriculture durable': 0.3,
-            'Construction durable': 0.4,
-            'Services': 0.5,
-            'Industrie légère': 0.7,
-            'Industrie lourde': 1.0
-        }
+# Historique : nombre maximal de points tracés et seuil de rendu WebGL (Scattergl)
+MAX_HISTORY_POINTS = 2000
+WEBGL_MIN_POINTS = 1000
 
-    def calculate_score(self, project_data):
-        # Calcul du score basé sur les facteurs pondérés
-        energy_score = self.energy_factors[project_data['energy']] * 25
-        transport_score = self.transport_factors[project_data['transport']] * 20
-        material_score = self.material_factors[project_data['materials']] * 15
-        sector_score = self.sector_factors[project_data['sector']] * 20
-        
-        # Facteur équipe (simplifié)
-        team_score = min(project_data['team_size'] / 50, 1) * 10
-        
-        # Facteur durée de vie (plus c'est long, mieux c'est)
-        duration_factor = max(0, 1 - project_data['duration'] / 20) * 10
-        
-        total_score = energy_score + transport_score + material_score + sector_score + team_score + duration_factor
-        
-        # Normalisation 0-100
-        return min(100, max(0, total_score))
+@st.cache_resource
+def get_scorer():
+    """Scorer partagé par les sessions (facteurs de data/emission_factors.json)"""
+    return CarbonScorer()
 
-    def get_classification(self, score):
-        if score <= 30:
-            return "🟢 Projet Vert", "#2E8B57"
-        elif score <= 60:
-            return "🟡 Projet Acceptable", "#FFD700"
-        else:
-            return "🔴 Projet Très Polluant", "#DC143C"
+def get_classification(score):
+    if score <= 30:
+        return "🟢 Projet Vert", "#2E8B57"
+    elif score <= 60:
+        return "🟡 Projet Acceptable", "#FFD700"
+    else:
+        return "🔴 Projet Très Polluant", "#DC143C"
 
-    def get_recommendations(self, project_data, score):
-        recommendations = []
-        
-        if project_data['energy'] == 'Énergie fossile (charbon, gaz)':
-            recommendations.append("💡 Privilégier les énergies renouvelables pour réduire l'impact de 60%")
-        
-        if project_data['transport'] == 'Transport international':
-            recommendations.append("🚛 Optimiser la logistique et privilégier les circuits courts")
-        
-        if project_data['materials'] == 'Béton/Acier':
-            recommendations.append("🏗️ Considérer des matériaux alternatifs (bois, matériaux recyclés)")
-        
-        if project_data['team_size'] > 100:
-            recommendations.append("👥 Évaluer l'optimisation des effectifs et du télétravail")
-        
-        if score > 60:
-            recommendations.append("🎯 Envisager une refonte du projet avec un focus environnemental")
-        
-        return recommendations
+def get_recommendations(project_data, score):
+    recommendations = []
+    
+    if project_data['energie'] == 'fossile':
+        recommendations.append("💡 Privilégier les énergies renouvelables pour réduire l'impact de 60%")
+    
+    if project_data['transport_type'] == 'aérien' or project_data['distance'] > 5000:
+        recommendations.append("🚛 Optimiser la logistique et privilégier les circuits courts")
+    
+    if project_data['materials'] in ('béton', 'acier'):
+        recommendations.append("🏗️ Considérer des matériaux alternatifs (bois, matériaux recyclés)")
+    
+    if project_data['team_size'] > 100:
+        recommendations.append("👥 Évaluer l'optimisation des effectifs et du télétravail")
+    
+    if score > 60:
+        recommendations.append("🎯 Envisager une refonte du projet avec un focus environnemental")
+    
+    return recommendations
+
+def select_factor(label, scorer, table, index=0):
+    """Liste déroulante des modalités d'une table de facteurs, avec leurs libellés d'affichage"""
+    labels = scorer.factors.labels.get(table, {})
+    options = {labels.get(value, value): value for value in scorer.factors.factors[table]}
+    return options[st.selectbox(label, list(options), index=index)]
 
 def create_gauge_chart(score):
     fig = go.Figure(go.Indicator(
@@ -197,15 +167,10 @@ def create_gauge_chart(score):
     
     return fig
 
-def create_impact_breakdown(project_data, scorer):
-    categories = ['Énergie', 'Transport', 'Matériaux', 'Secteur', 'Équipe']
-    values = [
-        scorer.energy_factors[project_data['energy']] * 25,
-        scorer.transport_factors[project_data['transport']] * 20,
-        scorer.material_factors[project_data['materials']] * 15,
-        scorer.sector_factors[project_data['sector']] * 20,
-        min(project_data['team_size'] / 50, 1) * 10
-    ]
+def create_impact_breakdown(impact_factors):
+    """Répartition du score par catégorie (composantes déjà calculées par get_impact_factors)"""
+    categories = list(impact_factors)
+    values = list(impact_factors.values())
     
     fig = px.bar(
         x=categories,
@@ -224,6 +189,68 @@ def create_impact_breakdown(project_data, scorer):
     
     return fig
 
+def lttb_downsample(x, y, n_out):
+    """Indices des points conservés par Largest-Triangle-Three-Buckets (premier et dernier inclus)
+    
+    Chaque intervalle garde le point formant le plus grand triangle avec le point retenu
+    précédemment et la moyenne de l'intervalle suivant : pics et creux restent visibles.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 intervalles entre le premier et le dernier point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+def create_history_chart(scores):
+    """Évolution des scores ; historiques longs sous-échantillonnés (LTTB) et rendus en WebGL"""
+    scores = np.asarray(scores, dtype=np.float64)
+    x = np.arange(len(scores))
+    indices = lttb_downsample(x, scores, MAX_HISTORY_POINTS)
+    title = "Évolution des Scores Carbone"
+    if len(indices) < len(scores):
+        title += f" ({len(indices)} points sur {len(scores)})"
+    
+    webgl = len(indices) >= WEBGL_MIN_POINTS
+    trace = go.Scattergl if webgl else go.Scatter
+    fig = go.Figure(trace(
+        x=x[indices],
+        y=scores[indices],
+        mode='lines' if webgl else 'lines+markers',
+        name='score'
+    ))
+    fig.update_layout(title=title, xaxis_title="Évaluation", yaxis_title="score")
+    fig.add_hline(y=30, line_dash="dash", line_color="green", annotation_text="Seuil Vert")
+    fig.add_hline(y=60, line_dash="dash", line_color="red", annotation_text="Seuil Critique")
+    return fig
+
+def get_portfolio():
+    """Agrégats incrémentaux des projets évalués pendant la session"""
+    if 'portfolio' not in st.session_state:
+        portfolio = PortfolioRollups(groupings=[('sector',)])
+        for i, project in enumerate(st.session_state.get('projects_history', [])):
+            portfolio.add(i, project, carbon_score=project['score'])
+        st.session_state.portfolio = portfolio
+    return st.session_state.portfolio
+
 def main():
     # Header principal
     st.markdown("""
@@ -246,7 +273,9 @@ def main():
             ["📊 Évaluation de Projet", "📈 Historique", "ℹ️ À Propos"]
         )
 
-    scorer = CarbonScorer()
+    # Rechargement à chaud des facteurs si le fichier a été modifié, puis jeu figé pour ce rendu
+    get_scorer().reload_if_changed()
+    scorer = get_scorer().snapshot()
 
     if page == "📊 Évaluation de Projet":
         st.markdown("## 📝 Nouveau Projet à Évaluer")
@@ -260,21 +289,23 @@ def main():
                 project_description = st.text_area("Description", placeholder="Décrivez brièvement votre projet...")
                 
                 st.markdown("### ⚡ Énergie")
-                energy = st.selectbox("Type d'énergie principal", list(scorer.energy_factors.keys()))
+                energy = select_factor("Type d'énergie principal", scorer, 'energy')
                 
                 st.markdown("### 🚛 Transport")
-                transport = st.selectbox("Logistique transport", list(scorer.transport_factors.keys()))
+                transport = select_factor("Mode de transport", scorer, 'transport')
+                distance = st.number_input("Distance transport (km)", min_value=0, max_value=20000, value=1000, step=50)
+                frequency = select_factor("Fréquence transport", scorer, 'frequency', index=1)
             
             with col2:
                 st.markdown("### 🏗️ Matériaux")
-                materials = st.selectbox("Matériaux principaux", list(scorer.material_factors.keys()))
+                materials = select_factor("Matériaux principaux", scorer, 'material')
                 
                 st.markdown("### 🏭 Secteur")
-                sector = st.selectbox("Secteur d'activité", list(scorer.sector_factors.keys()))
+                sector = select_factor("Secteur d'activité", scorer, 'sector')
                 
                 st.markdown("### 👥 Équipe & Durée")
                 team_size = st.slider("Taille de l'équipe", 1, 200, 20)
-                duration = st.slider("Durée de vie du projet (années)", 1, 30, 10)
+                duration = st.slider("Durée de vie du projet (années)", 1, 50, 10)
             
             submitted = st.form_submit_button("🚀 Évaluer le Projet", use_container_width=True)
             
@@ -286,18 +317,21 @@ def main():
                 project_data = {
                     'name': project_name,
                     'description': project_description,
-                    'energy': energy,
-                    'transport': transport,
+                    'energie': energy,
+                    'transport_type': transport,
+                    'distance': distance,
+                    'frequency': frequency,
                     'materials': materials,
                     'sector': sector,
                     'team_size': team_size,
                     'duration': duration
                 }
                 
-                # Calcul du score
-                score = scorer.calculate_score(project_data)
-                classification, color = scorer.get_classification(score)
-                recommendations = scorer.get_recommendations(project_data, score)
+                # Calcul du score à partir de ses composantes (réutilisées pour les graphiques)
+                impact_factors = scorer.get_impact_factors(project_data)
+                score = scorer.score_from_impact_factors(impact_factors)
+                classification, color = get_classification(score)
+                recommendations = get_recommendations(project_data, score)
                 
                 # Sauvegarde dans la session
                 if 'projects_history' not in st.session_state:
@@ -308,9 +342,11 @@ def main():
                     'score': score,
                     'classification': classification,
                     'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
-                    'recommendations': recommendations
+                    'recommendations': recommendations,
+                    'factors_version': scorer.factors_version
                 }
                 
+                get_portfolio().add(len(st.session_state.projects_history), project_data, carbon_score=score)
                 st.session_state.projects_history.append(project_result)
                 
                 # Affichage des résultats
@@ -331,7 +367,7 @@ def main():
                     """, unsafe_allow_html=True)
                 
                 with col3:
-                    st.plotly_chart(create_impact_breakdown(project_data, scorer), use_container_width=True)
+                    st.plotly_chart(create_impact_breakdown(impact_factors), use_container_width=True)
                 
                 # Recommandations
                 if recommendations:
@@ -348,11 +384,11 @@ def main():
                 with col1:
                     st.metric("🌱 Potentiel Vert", f"{100-score:.0f}%", f"+{(100-score)/10:.1f}")
                 with col2:
-                    st.metric("⚡ Impact Énergie", f"{scorer.energy_factors[energy]*25:.1f}", "pts")
+                    st.metric("⚡ Impact Énergie", f"{impact_factors['Énergie']:.1f}", "pts")
                 with col3:
-                    st.metric("🚛 Impact Transport", f"{scorer.transport_factors[transport]*20:.1f}", "pts")
+                    st.metric("🚛 Impact Transport", f"{impact_factors['Transport']:.1f}", "pts")
                 with col4:
-                    st.metric("🏗️ Impact Matériaux", f"{scorer.material_factors[materials]*15:.1f}", "pts")
+                    st.metric("🏗️ Impact Matériaux", f"{impact_factors['Matériaux']:.1f}", "pts")
 
     elif page == "📈 Historique":
         st.markdown("## 📊 Historique des Projets Évalués")
@@ -360,36 +396,31 @@ def main():
         if 'projects_history' not in st.session_state or not st.session_state.projects_history:
             st.info("Aucun projet évalué pour le moment. Commencez par évaluer un projet !")
         else:
-            # Tableau des projets
-            df = pd.DataFrame(st.session_state.projects_history)
+            history = st.session_state.projects_history
             
-            # Métriques globales
+            # Métriques globales (agrégats maintenus à chaque évaluation)
+            totals = get_portfolio().totals()
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("📊 Total Projets", len(df))
+                st.metric("📊 Total Projets", totals['count'])
             with col2:
-                st.metric("🟢 Projets Verts", len(df[df['score'] <= 30]))
+                st.metric("🟢 Projets Verts", totals['categories']['Vert'])
             with col3:
-                st.metric("🟡 Projets Acceptables", len(df[(df['score'] > 30) & (df['score'] <= 60)]))
+                st.metric("🟡 Projets Acceptables", totals['categories']['Acceptable'])
             with col4:
-                st.metric("🔴 Projets Polluants", len(df[df['score'] > 60]))
+                st.metric("🔴 Projets Polluants", totals['categories']['Très polluant'])
             
             # Graphique historique
-            fig = px.line(
-                df, 
-                x=range(len(df)), 
-                y='score',
-                title="Évolution des Scores Carbone",
-                markers=True
-            )
-            fig.add_hline(y=30, line_dash="dash", line_color="green", annotation_text="Seuil Vert")
-            fig.add_hline(y=60, line_dash="dash", line_color="red", annotation_text="Seuil Critique")
-            
-            st.plotly_chart(fig, use_container_width=True)
+            scores = np.fromiter((project['score'] for project in history), dtype=np.float64, count=len(history))
+            st.plotly_chart(create_history_chart(scores), use_container_width=True)
             
-            # Tableau détaillé
+            # Tableau détaillé (colonnes affichées uniquement)
             st.markdown("### 📋 Détails des Projets")
-            display_df = df[['name', 'score', 'classification', 'date', 'sector']].copy()
+            display_columns = ['name', 'score', 'classification', 'date', 'sector', 'factors_version']
+            display_df = pd.DataFrame({
+                column: [project.get(column) for project in history]
+                for column in display_columns if column in history[-1]
+            })
             st.dataframe(display_df, use_container_width=True)
 
     else:  # À Propos
@@ -2,63 +2,212 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-import pandas as pd
 import numpy as np
+import heapq
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
 from utils.preprocessing import DataPreprocessor
 from utils.scoring_utils import CarbonScorer
 from utils.classification import CarbonClassifier
 from utils.association_rules import AssociationRulesMiner
+from utils.metrics import MetricsRegistry
+from utils.schema import PROJECT_FIELDS, project_to_record
+from utils.similarity import SimilarProjectsIndex
+from utils.counterfactual import CounterfactualSearch
+from utils.portfolio import PortfolioRollups
+from utils.selection import PortfolioSelector
+from utils.ingest import ProjectStore
+from utils.drift import DriftMonitor
+from utils.tree_arrays import save_inference_artifacts, load_inference_artifacts
 
 class ProjectEvaluationPipeline:
-    def __init__(self):
-        self.preprocessor = DataPreprocessor()
+    def __init__(self, metrics=None, profiler=None, feature_cache_size=1024):
+        # Instrumentation : registre de métriques et profileur optionnel (SlowRequestProfiler)
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.profiler = profiler
+        self.preprocessor = DataPreprocessor(metrics=self.metrics)
         self.scorer = CarbonScorer()
         self.classifier = CarbonClassifier()
-        self.rules_miner = AssociationRulesMiner()
+        self.rules_miner = AssociationRulesMiner(metrics=self.metrics)
+        self.similarity_index = None
+        self._counterfactual_search = None
         self.is_trained = False
+        # Suivi de la dérive des entrées : distribution d'entraînement et flux évalué
+        self.drift_reference = None
+        self.drift_monitor = DriftMonitor()
+        # Cache des features encodées par projet (évaluations répétées)
+        self.feature_cache_size = feature_cache_size
+        self._feature_cache = OrderedDict()
+        # Le pipeline est partagé entre threads : séquence lecture / déplacement / éviction protégée
+        self._feature_cache_lock = threading.Lock()
+    
+    def _stage(self, operation, stage):
+        """Chronomètre une étape d'une opération du pipeline"""
+        return self.metrics.timer('stage_duration_seconds', operation=operation, stage=stage)
+    
+    def _profile(self, operation):
+        """Active le profileur sur l'opération s'il est configuré"""
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.profile(operation)
         
-    def train_models(self, data_filepath):
-        """Entraîne tous les modèles"""
-        print("Chargement et préparation des données...")
-        
-        # Préparation des données
-        X, y, df_original = self.preprocessor.preprocess_pipeline(data_filepath)
-        
-        # Division des données
-        X_train, X_test, y_train, y_test = self.preprocessor.split_data(X, y)
+    def train_models(self, data_filepath, min_support=0.15, min_confidence=0.6, segment_column=None):
+        """Entraîne tous les modèles (segment_column : règles par segment, ex. 'Secteur')"""
+        with self._profile('train_models'), self.metrics.timer('operation_duration_seconds', operation='train_models'):
+            print("Chargement et préparation des données...")
+            
+            # Préparation des données
+            with self._stage('train_models', 'preprocessing'):
+                X, y, df_original = self.preprocessor.preprocess_pipeline(data_filepath)
+            
+            # Division des données
+            with self._stage('train_models', 'split'):
+                X_train, X_test, y_train, y_test = self.preprocessor.split_data(X, y)
+            
+            print("Entraînement du modèle de classification...")
+            # Entraînement du classificateur
+            feature_names = X.columns.tolist()
+            with self._stage('train_models', 'training'):
+                self.classifier.train_model(X_train, y_train, feature_names)
+            
+            # Évaluation
+            with self._stage('train_models', 'evaluation'):
+                evaluation = self.classifier.evaluate_model(X_test, y_test)
+            print(f"Précision du modèle: {evaluation['accuracy']:.2f}")
+            
+            # Sauvegarde du modèle
+            with self._stage('train_models', 'save_model'):
+                os.makedirs('models', exist_ok=True)
+                self.classifier.save_model('models/decision_tree_model.pkl')
+                self.export_inference_artifacts('models/inference_model.npz')
+            
+            print("Extraction des règles d'association...")
+            # Extraction des règles d'association
+            with self._stage('train_models', 'rules_mining'):
+                rules = self.rules_miner.mine_association_rules(df_original, min_support=min_support, min_confidence=min_confidence)
+            print(f"Nombre de règles extraites: {len(rules)}")
+            
+            if segment_column is not None:
+                with self._stage('train_models', 'segmented_rules_mining'):
+                    segment_rules = self.rules_miner.mine_segmented_rules(
+                        df_original, segment_column=segment_column,
+                        min_support=min_support, min_confidence=min_confidence
+                    )
+                print(f"Règles par segment ({segment_column}): " +
+                      ", ".join(f"{segment}: {len(r)}" for segment, r in segment_rules.items()))
+                self.rules_miner.save_segment_rules('models/segment_rules.pkl')
+            elif os.path.exists('models/segment_rules.pkl'):
+                # Entraînement sans segmentation : les règles par segment précédentes ne sont plus valides
+                os.remove('models/segment_rules.pkl')
+            
+            # Index des projets similaires sur les features encodées
+            with self._stage('train_models', 'similarity_index'):
+                self.similarity_index = SimilarProjectsIndex().build(
+                    X.values, feature_names, self.preprocessor.get_vocabularies(),
+                    names=df_original['Nom du projet'].tolist(),
+                    budgets=df_original['Budget carbone estimé (tCO2e)'].tolist()
+                )
+                self.similarity_index.save('models/similar_projects_index.pkl')
+            
+            # Distribution de référence pour le suivi de la dérive
+            with self._stage('train_models', 'drift_reference'):
+                self.drift_reference = DriftMonitor().update_dataframe(df_original)
+                self.drift_reference.save('models/drift_reference.json')
+                self.drift_monitor.reset()
+            with self._feature_cache_lock:
+                self._feature_cache.clear()
+            self._counterfactual_search = None
         
-        print("Entraînement du modèle de classification...")
-        # Entraînement du classificateur
-        feature_names = X.columns.tolist()
-        self.classifier.train_model(X_train, y_train, feature_names)
+        self.is_trained = True
+        return evaluation, rules
+    
+    def ingest_data(self, data_filepath, store_dir='data/store'):
+        """Ajoute un export au stockage incrémental en ignorant les lignes déjà reçues
         
-        # Évaluation
-        evaluation = self.classifier.evaluate_model(X_test, y_test)
-        print(f"Précision du modèle: {evaluation['accuracy']:.2f}")
+        Le stockage (répertoire) peut ensuite être passé à train_models comme un fichier CSV.
+        """
+        with self.metrics.timer('operation_duration_seconds', operation='ingest_data'):
+            df = self.preprocessor.load_data(data_filepath)
+            stats = ProjectStore(store_dir).ingest(df)
+        self.metrics.inc('ingested_rows', stats['appended'], status='appended')
+        self.metrics.inc('ingested_rows', stats['duplicates_in_batch'] + stats['already_stored'], status='duplicate')
+        print(f"Ingestion: {stats['appended']} nouvelles lignes, "
+              f"{stats['already_stored']} déjà stockées, {stats['duplicates_in_batch']} doublons dans le lot")
+        return stats
+    
+    def refresh_models(self, new_data_filepath, test_size=0.2):
+        """Rafraîchit le modèle avec un lot de nouveaux projets, sans réentraînement complet
         
-        # Sauvegarde du modèle
-        os.makedirs('models', exist_ok=True)
-        self.classifier.save_model('models/decision_tree_model.pkl')
+        Les vocabulaires des encodeurs sont étendus (codes existants inchangés), un arbre
+        entraîné sur le lot est ajouté à l'ensemble et l'évaluation porte uniquement sur la
+        partie de test du lot. Les règles d'association ne sont pas ré-extraites.
+        """
+        if not self.is_trained:
+            raise ValueError("Les modèles ne sont pas entraînés ou chargés")
         
-        print("Extraction des règles d'association...")
-        # Extraction des règles d'association
-        rules = self.rules_miner.mine_association_rules(df_original, min_support=0.15, min_confidence=0.6)
-        print(f"Nombre de règles extraites: {len(rules)}")
+        operation = 'refresh_models'
+        with self._profile(operation), self.metrics.timer('operation_duration_seconds', operation=operation):
+            with self._stage(operation, 'preprocessing'):
+                df_new = self.preprocessor.load_data(new_data_filepath)
+                df_new = self.preprocessor.clean_data(df_new)
+                df_new = self.preprocessor.create_carbon_category(df_new)
+                added = self.preprocessor.extend_encoders(df_new)
+                df_encoded = self.preprocessor.encode_categorical_variables(df_new, fit=False)
+                X_new = self.preprocessor.prepare_features(df_encoded)
+                y_new = df_encoded['Catégorie_Carbone']
+            
+            for col, values in added.items():
+                print(f"Nouvelles modalités pour {col}: {', '.join(map(str, values))}")
+            
+            # Les très petits lots servent entièrement à l'entraînement
+            if len(X_new) >= 10:
+                X_train, X_test, y_train, y_test = self.preprocessor.split_data(X_new, y_new, test_size=test_size)
+            else:
+                X_train, X_test, y_train, y_test = X_new, None, y_new, None
+            
+            print(f"Rafraîchissement du modèle sur {len(X_train)} nouveaux projets...")
+            with self._stage(operation, 'training'):
+                self.classifier.refresh_model(X_train, y_train)
+            
+            evaluation = None
+            if X_test is not None:
+                with self._stage(operation, 'evaluation'):
+                    evaluation = self.classifier.evaluate_model(X_test, y_test)
+                print(f"Précision sur les nouveaux projets: {evaluation['accuracy']:.2f}")
+            
+            with self._stage(operation, 'save_model'):
+                os.makedirs('models', exist_ok=True)
+                self.classifier.save_model('models/decision_tree_model.pkl')
+                self.export_inference_artifacts('models/inference_model.npz')
+            with self._feature_cache_lock:
+                self._feature_cache.clear()
+            self._counterfactual_search = None
         
-        self.is_trained = True
-        return evaluation, rules
+        return evaluation
     
-    def load_trained_models(self):
+    def load_trained_models(self, min_support=0.15, min_confidence=0.6):
         """Charge les modèles pré-entraînés"""
         model_loaded = self.classifier.load_model('models/decision_tree_model.pkl')
+        with self._feature_cache_lock:
+            self._feature_cache.clear()
+        self._counterfactual_search = None
         if model_loaded:
             self.is_trained = True
+            # Restaure les encodeurs catégoriels sauvegardés avec les artefacts d'inférence
+            if os.path.exists('models/inference_model.npz'):
+                artifacts = load_inference_artifacts('models/inference_model.npz')
+                self.preprocessor.set_vocabularies(artifacts['vocabularies'])
+            self.similarity_index = SimilarProjectsIndex.load('models/similar_projects_index.pkl')
+            self.drift_reference = DriftMonitor.load('models/drift_reference.json')
             # Recharge les règles d'association si nécessaire
             try:
                 df = self.preprocessor.load_data('data/dataset_projets_carbone_complet.csv')
-                self.rules_miner.mine_association_rules(df, min_support=0.15, min_confidence=0.6)
+                self.rules_miner.mine_association_rules(df, min_support=min_support, min_confidence=min_confidence)
             except:
                 pass
+            # Règles par segment sauvegardées lors de l'entraînement (train_models(segment_column=...))
+            self.rules_miner.load_segment_rules('models/segment_rules.pkl')
         return model_loaded
     
     def evaluate_single_project(self, project_data):
@@ -66,29 +215,44 @@ class ProjectEvaluationPipeline:
         if not self.is_trained:
             raise ValueError("Les modèles ne sont pas entraînés ou chargés")
         
-        # Calcul du score carbone
-        carbon_score = self.scorer.calculate_carbon_score(project_data)
-        carbon_category = self.scorer.get_carbon_category(carbon_score)
-        
-        # Calcul du score ESG
-        esg_score = self.scorer.calculate_esg_score(project_data, carbon_score)
-        
-        # Facteurs d'impact
-        impact_factors = self.scorer.get_impact_factors(project_data)
-        
-        # Prédiction par le modèle de classification
-        project_features = self._prepare_project_for_prediction(project_data)
-        if project_features is not None:
-            ml_prediction = self.classifier.predict(project_features)[0]
-            ml_probabilities = self.classifier.predict_proba(project_features)[0]
-            decision_path = self.classifier.get_decision_path(project_features.flatten())
-        else:
-            ml_prediction = carbon_category
-            ml_probabilities = [0.33, 0.33, 0.34]
-            decision_path = []
-        
-        # Recommandations basées sur les règles d'association
-        recommendations = self.rules_miner.get_recommendations_for_project(project_data)
+        operation = 'evaluate_single_project'
+        # Jeu de facteurs figé pour toute l'évaluation (rechargements concurrents sans effet)
+        scorer = self.scorer.snapshot()
+        self.drift_monitor.update(project_data)
+        with self._profile(operation), self.metrics.timer('operation_duration_seconds', operation=operation):
+            # Calcul du score carbone
+            with self._stage(operation, 'scoring'):
+                # Les facteurs d'impact sont les composantes du score : calculés une seule fois
+                impact_factors = scorer.get_impact_factors(project_data)
+                carbon_score = scorer.score_from_impact_factors(impact_factors)
+                carbon_category = scorer.get_carbon_category(carbon_score)
+            
+            # Calcul du score ESG
+            with self._stage(operation, 'esg'):
+                esg_score = scorer.calculate_esg_score(project_data, carbon_score)
+            
+            # Prédiction par le modèle de classification
+            with self._stage(operation, 'feature_preparation'):
+                project_features = self._prepare_project_for_prediction(project_data)
+            if project_features is not None:
+                with self._stage(operation, 'prediction'):
+                    ml_prediction = self.classifier.predict(project_features)[0]
+                    ml_probabilities = self.classifier.predict_proba(project_features)[0]
+                with self._stage(operation, 'decision_path'):
+                    decision_path = self.classifier.get_decision_path(project_features.flatten())
+                with self._stage(operation, 'feature_contributions'):
+                    feature_contributions = self._contributions_for_prediction(
+                        self.classifier.get_feature_contributions(project_features), [ml_prediction]
+                    )[0]
+            else:
+                ml_prediction = carbon_category
+                ml_probabilities = [0.33, 0.33, 0.34]
+                decision_path = []
+                feature_contributions = {}
+            
+            # Recommandations basées sur les règles d'association
+            with self._stage(operation, 'recommendations'):
+                recommendations = self.rules_miner.get_recommendations_for_project(project_data)
         
         return {
             'carbon_score': carbon_score,
@@ -98,53 +262,274 @@ class ProjectEvaluationPipeline:
             'ml_prediction': ml_prediction,
             'ml_probabilities': dict(zip(['Acceptable', 'Très polluant', 'Vert'], ml_probabilities)),
             'decision_path': decision_path,
-            'recommendations': recommendations
+            'feature_contributions': feature_contributions,
+            'recommendations': recommendations,
+            'factors_version': scorer.factors_version
         }
     
     def _prepare_project_for_prediction(self, project_data):
-        """Prépare les données du projet pour la prédiction"""
+        """Prépare les données du projet pour la prédiction (avec cache)"""
+        cache_key = tuple(project_data.get(key) for key, _, _ in PROJECT_FIELDS)
+        try:
+            hash(cache_key)
+        except TypeError:
+            # Valeurs non hachables : pas de mise en cache
+            cache_key = None
+        
+        features = None
+        if cache_key is not None:
+            with self._feature_cache_lock:
+                features = self._feature_cache.get(cache_key)
+                if features is not None:
+                    self._feature_cache.move_to_end(cache_key)
+        if features is not None:
+            self.metrics.inc('feature_cache_hits')
+            return features
+        self.metrics.inc('feature_cache_misses')
+        
+        features = self._encode_project_features(project_data)
+        if features is not None and cache_key is not None and self.feature_cache_size > 0:
+            with self._feature_cache_lock:
+                self._feature_cache[cache_key] = features
+                while len(self._feature_cache) > self.feature_cache_size:
+                    self._feature_cache.popitem(last=False)
+        return features
+    
+    def _encode_project_features(self, project_data):
+        """Encode les données du projet en vecteur de features"""
         try:
-            # Crée un DataFrame avec les données du projet
-            project_df = pd.DataFrame([{
-                'Secteur': project_data.get('sector', 'Production industrielle'),
-                'Énergie utilisée': project_data.get('energie', 'mix'),
-                'Type de transport': project_data.get('transport_type', 'routier'),
-                'Distance transport (km)': project_data.get('distance', 1000),
-                'Fréquence transport': project_data.get('frequency', 'mensuelle'),
-                'Matériaux': project_data.get('materials', 'plastique'),
-                'Taille de l\'équipe / locaux': project_data.get('team_size', 50),
-                'Durée de vie estimée (ans)': project_data.get('duration', 20),
-                'Score ESG initial': project_data.get('esg_initial', 50)
-            }])
-            
-            # Encode les variables catégorielles
-            project_encoded = self.preprocessor.encode_categorical_variables(project_df, fit=False)
-            
-            # Prépare les features
-            features = self.preprocessor.prepare_features(project_encoded)
-            
-            return features.values
+            # Encode directement la ligne du projet (équivalent à encode_categorical_variables
+            # puis prepare_features, sans le coût de construction d'un DataFrame)
+            return self.preprocessor.encode_record(project_to_record(project_data))
             
         except Exception as e:
             print(f"Erreur lors de la préparation des données: {e}")
             return None
     
+    def explore_rule_thresholds(self, data_filepath, grid, n_jobs=None):
+        """Extrait les règles d'association pour une grille de seuils (support, métrique, seuil)"""
+        df = self.preprocessor.load_data(data_filepath)
+        return self.rules_miner.mine_rules_grid(df, grid, n_jobs=n_jobs)
+    
+    def export_inference_artifacts(self, filepath):
+        """Exporte l'arbre et les encodeurs pour l'inférence légère (app/inference.py)"""
+        trees, weights = self.classifier.get_ensemble_tree_arrays()
+        save_inference_artifacts(
+            filepath,
+            trees=trees,
+            weights=weights,
+            feature_names=self.classifier.feature_names,
+            vocabularies=self.preprocessor.get_vocabularies()
+        )
+    
+    def _prepare_projects_for_prediction(self, projects_list):
+        """Encode un lot de projets en matrice de features"""
+        import pandas as pd
+        projects_df = pd.DataFrame([project_to_record(project) for project in projects_list])
+        projects_encoded = self.preprocessor.encode_categorical_variables(projects_df, fit=False)
+        return self.preprocessor.prepare_features(projects_encoded).values
+    
+    def _contributions_for_prediction(self, contributions, predictions):
+        """Contributions de chaque feature à la probabilité de la classe prédite"""
+        classes = list(self.classifier.model.classes_)
+        return [
+            dict(zip(self.classifier.feature_names, sample_contributions[:, classes.index(prediction)].tolist()))
+            for sample_contributions, prediction in zip(contributions, predictions)
+        ]
+    
+    def explain_projects(self, projects_list):
+        """Prédictions et contributions des features pour un lot de projets (vectorisé)"""
+        if not self.is_trained:
+            raise ValueError("Les modèles ne sont pas entraînés ou chargés")
+        if not projects_list:
+            return []
+        
+        self.drift_monitor.update_batch(projects_list)
+        with self.metrics.timer('operation_duration_seconds', operation='explain_projects'):
+            features = self._prepare_projects_for_prediction(projects_list)
+            predictions = self.classifier.predict(features)
+            contributions = self._contributions_for_prediction(
+                self.classifier.get_feature_contributions(features), predictions
+            )
+        return [
+            {'ml_prediction': prediction, 'feature_contributions': project_contributions}
+            for prediction, project_contributions in zip(predictions, contributions)
+        ]
+    
+    def build_portfolio(self, data_filepath, groupings=None):
+        """Agrégats incrémentaux (secteur, énergie, catégorie...) d'un portefeuille au format du dataset"""
+        with self.metrics.timer('operation_duration_seconds', operation='build_portfolio'):
+            df = self.preprocessor.load_data(data_filepath)
+            return PortfolioRollups.from_dataframe(df, groupings=groupings, scorer=self.scorer)
+    
+    def select_portfolio(self, data_filepath, carbon_budget, objective='esg', method='auto'):
+        """Projets à financer sous un plafond de tCO2e, en maximisant l'ESG ('esg') ou le nombre de projets ('count')
+        
+        PortfolioSelector.explain(résultat) détaille la valeur marginale par tCO2e autour du seuil.
+        """
+        with self.metrics.timer('operation_duration_seconds', operation='select_portfolio'):
+            df = self.preprocessor.load_data(data_filepath)
+            return PortfolioSelector(self.scorer).select_from_dataframe(df, carbon_budget, objective=objective, method=method)
+    
+    def _get_counterfactual_search(self):
+        """Moteur de recherche contrefactuelle (feuilles de l'arbre pré-calculées une fois)"""
+        search = self._counterfactual_search
+        if search is None or search.factors_version != self.scorer.factors_version:
+            if self.is_trained:
+                trees, weights = self.classifier.get_ensemble_tree_arrays()
+                self._counterfactual_search = CounterfactualSearch(
+                    self.scorer, trees=trees, weights=weights,
+                    feature_names=self.classifier.feature_names,
+                    vocabularies=self.preprocessor.get_vocabularies()
+                )
+            else:
+                self._counterfactual_search = CounterfactualSearch(self.scorer)
+        return self._counterfactual_search
+    
+    def reload_emission_factors(self):
+        """Recharge data/emission_factors.json s'il a changé (les tables dépendantes sont reconstruites)"""
+        reloaded = self.scorer.reload_if_changed()
+        if reloaded:
+            self.metrics.inc('emission_factors_reloads')
+            print(f"Facteurs d'émission rechargés (version {self.scorer.factors_version})")
+        return reloaded
+
+    def drift_report(self, n_bins=10):
+        """Dérive des entrées évaluées depuis l'entraînement (PSI et KS par variable)"""
+        if self.drift_reference is None:
+            raise ValueError("La distribution de référence n'est pas disponible (modèles à réentraîner)")
+        report = self.drift_monitor.report(self.drift_reference, n_bins=n_bins)
+        for feature, feature_report in report.items():
+            if feature_report['status'] == 'forte':
+                self.metrics.inc('input_drift_alerts', feature=feature)
+        return report
+
+    def merge_drift_monitor(self, other):
+        """Agrège le suivi de dérive d'un autre worker (DriftMonitor ou son to_dict())"""
+        if isinstance(other, dict):
+            other = DriftMonitor.from_dict(other)
+        self.drift_monitor.merge(other)
+        return self.drift_monitor
+
+    def find_green_changes(self, project_data, target='score', time_budget_s=0.05):
+        """Changements d'entrées les moins coûteux pour que le projet passe en 'Vert'
+        
+        target : 'score' (score carbone), 'model' (prédiction du classificateur) ou 'both'.
+        """
+        return self.find_green_changes_batch([project_data], target=target, time_budget_s=time_budget_s)[0]
+    
+    def find_green_changes_batch(self, projects_list, target='score', time_budget_s=0.05):
+        """Recherche contrefactuelle pour un portefeuille (budget de temps par projet)"""
+        search = self._get_counterfactual_search()
+        with self.metrics.timer('operation_duration_seconds', operation='find_green_changes'):
+            results = search.search_batch(projects_list, target=target, time_budget_s=time_budget_s)
+        for result in results:
+            if result['timed_out']:
+                self.metrics.inc('counterfactual_budget_exceeded')
+        return results
+    
+    def find_similar_projects(self, project_data, k=5):
+        """Retourne les k projets historiques les plus proches (nom, budget carbone, distance)"""
+        if self.similarity_index is None:
+            raise ValueError("L'index des projets similaires n'est pas disponible")
+        
+        with self.metrics.timer('operation_duration_seconds', operation='find_similar_projects'):
+            project_features = self._prepare_project_for_prediction(project_data)
+            if project_features is None:
+                return []
+            return self.similarity_index.neighbours(project_features, k=k)[0]
+    
+    def find_similar_projects_batch(self, projects_list, k=5):
+        """Recherche des projets similaires pour un lot de projets"""
+        if self.similarity_index is None:
+            raise ValueError("L'index des projets similaires n'est pas disponible")
+        if not projects_list:
+            return []
+        self.drift_monitor.update_batch(projects_list)
+        return self.similarity_index.neighbours(self._prepare_projects_for_prediction(projects_list), k=k)
+    
+    def add_projects_to_index(self, projects_list, save=True):
+        """Ajoute des projets réalisés (avec 'carbon_budget') à l'index des projets similaires"""
+        if self.similarity_index is None:
+            raise ValueError("L'index des projets similaires n'est pas disponible")
+        
+        self.similarity_index.add(
+            self._prepare_projects_for_prediction(projects_list),
+            names=[project.get('name', f'Projet_{len(self.similarity_index) + i + 1}') for i, project in enumerate(projects_list)],
+            budgets=[project['carbon_budget'] for project in projects_list]
+        )
+        if save:
+            self.similarity_index.save('models/similar_projects_index.pkl')
+    
     def get_model_feature_importance(self):
         """Retourne l'importance des features du modèle"""
         if not self.is_trained:
             return None
         return self.classifier.get_feature_importance()
     
-    def compare_projects(self, projects_list):
-        """Compare plusieurs projets"""
-        results = []
-        for i, project in enumerate(projects_list):
-            project['name'] = project.get('name', f'Projet_{i+1}')
+    def iter_project_evaluations(self, projects):
+        """Évalue les projets un à un (générateur), sans modifier les dictionnaires fournis"""
+        for i, project in enumerate(projects):
             evaluation = self.evaluate_single_project(project)
-            evaluation['project_name'] = project['name']
-            results.append(evaluation)
+            evaluation['project_name'] = project.get('name', f'Projet_{i+1}')
+            yield evaluation
+    
+    @staticmethod
+    def compact_evaluation(evaluation):
+        """Résumé d'une évaluation (nom, score, catégorie, probabilités) pour l'export"""
+        row = {
+            'name': evaluation['project_name'],
+            'carbon_score': float(evaluation['carbon_score']),
+            'carbon_category': evaluation['carbon_category'],
+            'esg_score': float(evaluation['esg_score']),
+            'ml_prediction': str(evaluation['ml_prediction']),
+            'factors_version': evaluation['factors_version']
+        }
+        for category, probability in evaluation['ml_probabilities'].items():
+            row[f'proba_{category}'] = float(probability)
+        return row
+    
+    def rank_projects(self, projects, k=10, worst=False, sink=None):
+        """Retourne les k meilleurs projets (score carbone le plus bas) ou les k pires
+        
+        Les projets (liste ou itérable) sont évalués à la volée et seules les k meilleures
+        évaluations sont conservées dans un tas borné ; sink (JsonlSink / ParquetSink) reçoit
+        optionnellement le résumé de chaque évaluation.
+        """
+        heap = []
+        with self.metrics.timer('operation_duration_seconds', operation='rank_projects'):
+            for index, evaluation in enumerate(self.iter_project_evaluations(projects)):
+                if sink is not None:
+                    sink.write(self.compact_evaluation(evaluation))
+                if k <= 0:
+                    continue
+                # Le sommet du tas est le moins bon des k retenus ; égalités : ordre d'arrivée
+                score = evaluation['carbon_score']
+                key = (score, -index) if worst else (-score, -index)
+                if len(heap) < k:
+                    heapq.heappush(heap, (key, evaluation))
+                elif key > heap[0][0]:
+                    heapq.heapreplace(heap, (key, evaluation))
+        
+        return [evaluation for _, evaluation in sorted(heap, key=lambda item: item[0], reverse=True)]
+    
+    def compare_projects(self, projects_list, top_k=None, worst=False, sink=None):
+        """Compare plusieurs projets (triés par score carbone)
+        
+        top_k limite le résultat aux k meilleurs (ou pires avec worst=True) sans conserver
+        toutes les évaluations ; sink reçoit le résumé de chaque évaluation.
+        """
+        if top_k is not None:
+            return self.rank_projects(projects_list, k=top_k, worst=worst, sink=sink)
+        
+        results = []
+        with self.metrics.timer('operation_duration_seconds', operation='compare_projects'):
+            for evaluation in self.iter_project_evaluations(projects_list):
+                if sink is not None:
+                    sink.write(self.compact_evaluation(evaluation))
+                results.append(evaluation)
         
         # Trie par score carbone
-        results.sort(key=lambda x: x['carbon_score'])
+        results.sort(key=lambda x: x['carbon_score'], reverse=worst)
         
-        return results
\ No newline at end of file
+        return results
@@ -0,0 +1,81 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Modalités observées dans data/dataset_projets_carbone_complet.csv
+SECTEURS = ['Production industrielle', 'Agriculture durable', 'Projets numériques',
+            'Construction immobilière', 'Transport / logistique']
+ENERGIES = ['renouvelable', 'mix', 'fossile']
+TRANSPORTS = ['ferroviaire', 'routier', 'maritime', 'aérien']
+FREQUENCES = ['ponctuelle', 'mensuelle', 'hebdomadaire', 'quotidienne']
+MATERIAUX = ['bois', 'recyclé', 'verre', 'plastique', 'acier', 'béton']
+
+CSV_COLUMNS = [
+    'Nom du projet', 'Secteur', 'Énergie utilisée', 'Type de transport',
+    'Distance transport (km)', 'Fréquence transport', 'Matériaux',
+    'Taille de l’équipe / locaux', 'Durée de vie estimée (ans)',
+    'Budget carbone estimé (tCO2e)', 'Score ESG initial'
+]
+
+
+def generate_projects(n_rows, seed=42):
+    """Génère un jeu de projets synthétique au format du CSV"""
+    rng = np.random.default_rng(seed)
+
+    # Matériaux : 1 à 3 matériaux distincts par projet
+    n_materials = rng.integers(1, 4, size=n_rows)
+    material_draws = np.argsort(rng.random((n_rows, len(MATERIAUX))), axis=1)
+    materials = [
+        ', '.join(MATERIAUX[j] for j in material_draws[i, :n_materials[i]])
+        for i in range(n_rows)
+    ]
+
+    energy = rng.integers(0, len(ENERGIES), size=n_rows)
+    transport = rng.integers(0, len(TRANSPORTS), size=n_rows)
+    distance = np.round(rng.uniform(10, 10000, size=n_rows), 2)
+
+    # Budget carbone corrélé à l'énergie, au transport et à la distance
+    budget = rng.gamma(2.0, 60.0, size=n_rows) * (0.5 + energy) * (0.6 + 0.3 * transport)
+    budget = np.round(budget * (0.5 + distance / 10000), 2)
+
+    df = pd.DataFrame({
+        'Nom du projet': [f'Projet_{i + 1}' for i in range(n_rows)],
+        'Secteur': np.array(SECTEURS)[rng.integers(0, len(SECTEURS), size=n_rows)],
+        'Énergie utilisée': np.array(ENERGIES)[energy],
+        'Type de transport': np.array(TRANSPORTS)[transport],
+        'Distance transport (km)': distance,
+        'Fréquence transport': np.array(FREQUENCES)[rng.integers(0, len(FREQUENCES), size=n_rows)],
+        'Matériaux': materials,
+        'Taille de l’équipe / locaux': rng.integers(1, 200, size=n_rows),
+        'Durée de vie estimée (ans)': rng.integers(1, 50, size=n_rows),
+        'Budget carbone estimé (tCO2e)': budget,
+        'Score ESG initial': np.round(rng.uniform(0, 100, size=n_rows), 2)
+    })
+
+    return df[CSV_COLUMNS]
+
+
+def write_dataset(n_rows, directory, seed=42):
+    """Écrit le jeu synthétique en CSV (réutilise le fichier s'il existe déjà)"""
+    os.makedirs(directory, exist_ok=True)
+    filepath = os.path.join(directory, f'projets_synthetiques_{n_rows}.csv')
+    if not os.path.exists(filepath):
+        generate_projects(n_rows, seed=seed).to_csv(filepath, index=False)
+    return filepath
+
+
+def row_to_project(row):
+    """Convertit une ligne du CSV en dictionnaire projet attendu par le pipeline"""
+    return {
+        'name': row['Nom du projet'],
+        'sector': row['Secteur'],
+        'energie': row['Énergie utilisée'],
+        'transport_type': row['Type de transport'],
+        'distance': row['Distance transport (km)'],
+        'frequency': row['Fréquence transport'],
+        'materials': row['Matériaux'],
+        'team_size': row['Taille de l\'équipe / locaux'],
+        'duration': row['Durée de vie estimée (ans)'],
+        'esg_initial': row['Score ESG initial'],
+        'carbon_budget': row['Budget carbone estimé (tCO2e)']
+    }
@@ -0,0 +1,528 @@
+"""Test de charge du pipeline d'évaluation et de l'application Streamlit
+
+Rejoue des projets tirés du dataset (mélange d'opérations configurable) à plusieurs
+niveaux de concurrence (boucle fermée : chaque analyste enchaîne ses requêtes) ou de
+débit d'arrivée (boucle ouverte : arrivées poissonniennes, latence comptée depuis
+l'arrivée prévue, file d'attente comprise). Chaque niveau rapporte le débit, les
+latences p50/p95/p99 et la croissance de la mémoire résidente par session.
+
+Exemples :
+    python benchmarks/load_test.py pipeline --concurrency 1 2 4 8 --duration 10
+    python benchmarks/load_test.py pipeline --rate 50 100 200 --concurrency 8
+    python benchmarks/load_test.py app --concurrency 1 2 4 --duration 30
+    python benchmarks/load_test.py pipeline --save-baseline benchmarks/load_baseline.json
+    python benchmarks/load_test.py pipeline --compare benchmarks/load_baseline.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.datasets import row_to_project
+
+DEFAULT_DATASET = os.path.join(ROOT_DIR, 'data', 'dataset_projets_carbone_complet.csv')
+DEFAULT_WORKDIR = os.path.join(ROOT_DIR, 'benchmarks', '.cache', 'load_test')
+APP_SCRIPT = os.path.join(ROOT_DIR, 'app', 'main.py')
+
+PIPELINE_MIX = {'evaluate': 0.85, 'similar': 0.1, 'green_changes': 0.05}
+APP_MIX = {'submit': 0.8, 'history': 0.2}
+PERCENTILES = (50, 95, 99)
+
+
+def sample_projects(filepath, n_projects=1000, seed=42):
+    """Projets (dictionnaires) tirés du dataset : la distribution des modalités est celle des données réelles"""
+    from utils.preprocessing import DataPreprocessor
+    df = DataPreprocessor().load_data(filepath)
+    sample = df.sample(n=n_projects, replace=len(df) < n_projects, random_state=seed)
+    return [row_to_project(row) for row in sample.to_dict('records')]
+
+
+def parse_mix(items, default):
+    """Mélange d'opérations 'nom=poids' normalisé ; seules les opérations connues sont acceptées"""
+    if not items:
+        return dict(default)
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition('=')
+        if name not in default:
+            raise ValueError(f"Opération inconnue : {name} (attendu : {', '.join(default)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Les poids du mélange doivent être positifs")
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def rss_mb():
+    """Mémoire résidente courante du processus (pic si /proc n'est pas disponible)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+class PipelineTarget:
+    """Service adossé à ProjectEvaluationPipeline : une instance partagée par tous les workers"""
+
+    name = 'pipeline'
+    default_mix = PIPELINE_MIX
+    default_warmup = 20
+
+    def __init__(self, dataset, workdir):
+        from app.orchestration import ProjectEvaluationPipeline
+        # Les modèles entraînés sont écrits dans workdir/models
+        os.makedirs(workdir, exist_ok=True)
+        os.chdir(workdir)
+        self.pipeline = ProjectEvaluationPipeline()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.pipeline.train_models(dataset)
+
+    def new_session(self):
+        return self.pipeline
+
+    @staticmethod
+    def execute(pipeline, operation, project):
+        if operation == 'evaluate':
+            return pipeline.evaluate_single_project(project)
+        if operation == 'similar':
+            return pipeline.find_similar_projects(project)
+        return pipeline.find_green_changes(project)
+
+
+class AppTarget:
+    """Application Streamlit exécutée par l'API de test (une AppTest par session et par processus)
+
+    La latence de soumission inclut l'animation de chargement de l'application.
+    """
+
+    name = 'app'
+    default_mix = APP_MIX
+    # Chaque soumission dure plusieurs secondes : échauffement court
+    default_warmup = 2
+    isolated_sessions = True
+
+    # Listes déroulantes du formulaire : (libellé, table de facteurs, clé projet)
+    FORM_SELECTS = [
+        ("Type d'énergie principal", 'energy', 'energie'),
+        ("Mode de transport", 'transport', 'transport_type'),
+        ("Fréquence transport", 'frequency', 'frequency'),
+        ("Matériaux principaux", 'material', 'materials'),
+        ("Secteur d'activité", 'sector', 'sector')
+    ]
+
+    def __init__(self, script_path=APP_SCRIPT, timeout=60):
+        from utils.scoring_utils import CarbonScorer
+        self.script_path = script_path
+        self.timeout = timeout
+        self.factors = CarbonScorer().factors
+
+    def new_session(self):
+        from streamlit.testing.v1 import AppTest
+        app = AppTest.from_file(self.script_path, default_timeout=self.timeout)
+        app.run()
+        return app
+
+    def _option(self, table, value):
+        # Les listes affichent les libellés ; modalité inconnue : première option
+        labels = self.factors.labels.get(table, {})
+        if value not in self.factors.factors[table]:
+            value = next(iter(self.factors.factors[table]))
+        return labels.get(value, value)
+
+    def execute(self, app, operation, project):
+        # Les éléments sont relus après chaque exécution du script
+        if operation == 'history':
+            app.sidebar.selectbox[0].select("📈 Historique").run()
+            app.sidebar.selectbox[0].select("📊 Évaluation de Projet").run()
+        else:
+            # Le formulaire ne propose qu'un matériau : le premier du projet
+            values = dict(project, materials=project['materials'].split(', ')[0])
+            selects = {selectbox.label: selectbox for selectbox in app.selectbox}
+            app.text_input[0].input(str(project['name']))
+            for label, table, key in self.FORM_SELECTS:
+                selects[label].select(self._option(table, values[key]))
+            app.number_input[0].set_value(int(min(max(round(project['distance'] / 50) * 50, 0), 20000)))
+            app.slider[0].set_value(int(min(max(project['team_size'], 1), 200)))
+            app.slider[1].set_value(int(min(max(project['duration'], 1), 50)))
+            app.button[0].click().run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+
+
+class LoadGenerator:
+    """Rejoue un mélange d'opérations sur une cible (une session par worker)
+
+    Les sessions de la cible pipeline sont des threads partageant le même pipeline ; les
+    sessions Streamlit (isolated_sessions) tournent chacune dans un processus, l'API de
+    test n'autorisant qu'une application active par processus.
+    """
+
+    def __init__(self, target, projects, mix, seed=42):
+        self.target = target
+        self.projects = projects
+        self.mix = mix
+        self.operations = list(mix)
+        self.weights = [mix[operation] for operation in self.operations]
+        self.seed = seed
+
+    def _requests(self, rng):
+        """Suite infinie de (opération, projet) tirés selon le mélange"""
+        while True:
+            yield rng.choices(self.operations, self.weights)[0], rng.choice(self.projects)
+
+    def _execute(self, session, operation, project, arrival):
+        """Exécute une requête ; retourne (opération, latence depuis l'arrivée, erreur)"""
+        error = None
+        try:
+            self.target.execute(session, operation, project)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        return operation, time.time() - arrival, error
+
+    def warmup(self, n_requests, session=None):
+        """Requêtes séquentielles hors mesure (caches, tables compilées)"""
+        session = session if session is not None else self.target.new_session()
+        requests = self._requests(random.Random(self.seed - 1))
+        for _ in range(n_requests):
+            operation, project = next(requests)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.target.execute(session, operation, project)
+        return session
+
+    def run_level(self, concurrency, duration_s, rate=None, warmup=0):
+        """Un niveau de charge : concurrence fixe (boucle fermée) ou débit d'arrivée (boucle ouverte)"""
+        # Sorties des opérations masquées pour tout le niveau (redirect_stdout n'est pas sûr entre threads)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if getattr(self.target, 'isolated_sessions', False):
+                run = self._run_processes(concurrency, duration_s, rate, warmup)
+            else:
+                run = self._run_threads(concurrency, duration_s, rate)
+        return summarize(concurrency=concurrency, rate=rate, **run)
+
+    def _arrivals(self, rate, start, deadline):
+        """Arrivées poissonniennes (instant prévu, opération, projet) jusqu'à deadline"""
+        rng = random.Random(self.seed)
+        requests = self._requests(rng)
+        arrival = start
+        while True:
+            arrival += rng.expovariate(rate)
+            if arrival >= deadline:
+                return
+            time.sleep(max(0.0, arrival - time.time()))
+            operation, project = next(requests)
+            yield arrival, operation, project
+
+    def _run_threads(self, concurrency, duration_s, rate):
+        samples = []
+        samples_lock = threading.Lock()
+        local = threading.local()
+        sessions = []
+
+        def execute(operation, project, arrival):
+            if not hasattr(local, 'session'):
+                local.session = self.target.new_session()
+                with samples_lock:
+                    sessions.append(local.session)
+            sample = self._execute(local.session, operation, project, arrival)
+            with samples_lock:
+                samples.append(sample)
+
+        gc.collect()
+        rss_start = rss_mb()
+        start = time.time()
+        deadline = start + duration_s
+        if rate is None:
+            def worker(index):
+                requests = self._requests(random.Random(self.seed + index))
+                while time.time() < deadline:
+                    operation, project = next(requests)
+                    execute(operation, project, time.time())
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for arrival, operation, project in self._arrivals(rate, start, deadline):
+                    executor.submit(execute, operation, project, arrival)
+        elapsed = time.time() - start
+        gc.collect()
+        return {
+            'samples': samples, 'elapsed': elapsed, 'n_sessions': len(sessions),
+            'rss_start': rss_start, 'rss_end': rss_mb(), 'session_footprint': 0.0
+        }
+
+    def _run_processes(self, concurrency, duration_s, rate, warmup):
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        jobs = context.Queue() if rate is not None else None
+        start_event = context.Event()
+        processes = [
+            context.Process(target=_session_process, args=(
+                self.target, self.projects, self.mix, self.seed + index, duration_s,
+                warmup, start_event, jobs, results
+            ))
+            for index in range(concurrency)
+        ]
+        for process in processes:
+            process.start()
+        # Démarrage simultané une fois toutes les sessions créées et échauffées
+        for _ in processes:
+            results.get()
+        start = time.time()
+        start_event.set()
+        if jobs is not None:
+            for arrival, operation, project in self._arrivals(rate, start, start + duration_s):
+                jobs.put((operation, project, arrival))
+            for _ in processes:
+                jobs.put(None)
+
+        reports = [results.get() for _ in processes]
+        elapsed = time.time() - start
+        for process in processes:
+            process.join()
+        return {
+            'samples': [sample for report in reports for sample in report['samples']],
+            'elapsed': elapsed,
+            'n_sessions': len(processes),
+            'rss_start': sum(report['rss_start'] for report in reports),
+            'rss_end': sum(report['rss_end'] for report in reports),
+            'session_footprint': statistics.mean(report['footprint'] for report in reports)
+        }
+
+
+def _session_process(target, projects, mix, seed, duration_s, warmup, start_event, jobs, results):
+    """Processus d'une session isolée : requêtes en boucle fermée ou prises dans la file jobs"""
+    generator = LoadGenerator(target, projects, mix, seed=seed)
+    rss_before = rss_mb()
+    session = generator.warmup(warmup, target.new_session())
+    rss_start = rss_mb()
+    results.put('ready')
+    start_event.wait()
+
+    samples = []
+    sys.stdout = io.StringIO()
+    if jobs is None:
+        requests = generator._requests(random.Random(seed))
+        deadline = time.time() + duration_s
+        while time.time() < deadline:
+            operation, project = next(requests)
+            samples.append(generator._execute(session, operation, project, time.time()))
+    else:
+        for job in iter(jobs.get, None):
+            operation, project, arrival = job
+            samples.append(generator._execute(session, operation, project, arrival))
+    gc.collect()
+    results.put({'samples': samples, 'rss_start': rss_start, 'rss_end': rss_mb(), 'footprint': rss_start - rss_before})
+
+
+def _latency_summary(latencies):
+    latencies_ms = np.asarray(latencies) * 1000
+    if not len(latencies_ms):
+        return {'count': 0, 'mean_ms': 0.0, 'max_ms': 0.0, **{f'p{p}_ms': 0.0 for p in PERCENTILES}}
+    summary = {'count': len(latencies_ms), 'mean_ms': float(latencies_ms.mean()), 'max_ms': float(latencies_ms.max())}
+    for p, value in zip(PERCENTILES, np.percentile(latencies_ms, PERCENTILES)):
+        summary[f'p{p}_ms'] = float(value)
+    return summary
+
+
+def summarize(samples, elapsed, concurrency, rate, n_sessions, rss_start, rss_end, session_footprint=0.0):
+    """Débit, latences (globales et par opération), erreurs et mémoire d'un niveau
+
+    memory_growth_mb : croissance pendant la charge (sessions déjà créées et échauffées) ;
+    session_footprint_mb : mémoire d'une session isolée à sa création.
+    """
+    succeeded = [sample for sample in samples if sample[2] is None]
+    errors = {}
+    for _, _, error in samples:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+
+    growth = rss_end - rss_start
+    return {
+        'concurrency': concurrency,
+        'rate': rate,
+        'duration_s': elapsed,
+        'completed': len(succeeded),
+        'errors': sum(errors.values()),
+        'error_messages': dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+        'throughput_rps': len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        'latency': _latency_summary([sample[1] for sample in succeeded]),
+        'operations': {
+            operation: _latency_summary([sample[1] for sample in succeeded if sample[0] == operation])
+            for operation in sorted({sample[0] for sample in succeeded})
+        },
+        'sessions': n_sessions,
+        'rss_start_mb': rss_start,
+        'rss_end_mb': rss_end,
+        'memory_growth_mb': growth,
+        'memory_per_session_mb': growth / n_sessions if n_sessions else 0.0,
+        'session_footprint_mb': session_footprint
+    }
+
+
+def level_key(level):
+    return f"rate={level['rate']}" if level['rate'] is not None else f"concurrency={level['concurrency']}"
+
+
+def print_level(level):
+    latency = level['latency']
+    load = f"{level['rate']:>6g} req/s" if level['rate'] is not None else f"{level['concurrency']:>4} workers"
+    print(f"{load} | {level['throughput_rps']:>8.1f} req/s | p50 {latency['p50_ms']:>8.1f} ms"
+          f" | p95 {latency['p95_ms']:>8.1f} ms | p99 {latency['p99_ms']:>8.1f} ms"
+          f" | erreurs {level['errors']:>4} | mémoire {level['memory_growth_mb']:>+7.1f} Mo"
+          f" ({level['memory_per_session_mb']:>+6.2f} Mo/session)")
+    if level['session_footprint_mb']:
+        print(f"    session : {level['session_footprint_mb']:.1f} Mo à la création")
+    for message, count in level['error_messages'].items():
+        print(f"    {count} x {message}")
+
+
+def run_load_test(target_name, concurrency_levels, rates=None, duration_s=10.0, mix=None,
+                  dataset=DEFAULT_DATASET, n_projects=1000, warmup=None, seed=42, workdir=DEFAULT_WORKDIR):
+    """Exécute chaque niveau de charge et retourne le rapport (courbe de débit, latences, mémoire)"""
+    previous_cwd = os.getcwd()
+    dataset = os.path.abspath(dataset)
+    projects = sample_projects(dataset, n_projects, seed=seed)
+    try:
+        target = PipelineTarget(dataset, workdir) if target_name == 'pipeline' else AppTarget()
+        mix = mix or dict(target.default_mix)
+        warmup = target.default_warmup if warmup is None else warmup
+        generator = LoadGenerator(target, projects, mix, seed=seed)
+        if not getattr(target, 'isolated_sessions', False):
+            generator.warmup(warmup)
+
+        levels = []
+        if rates:
+            for rate in rates:
+                levels.append(generator.run_level(max(concurrency_levels), duration_s, rate=rate, warmup=warmup))
+                print_level(levels[-1])
+        else:
+            for concurrency in concurrency_levels:
+                levels.append(generator.run_level(concurrency, duration_s, warmup=warmup))
+                print_level(levels[-1])
+    finally:
+        os.chdir(previous_cwd)
+
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': target_name,
+            'mix': mix,
+            'dataset': os.path.basename(dataset),
+            'duration_s': duration_s
+        },
+        'levels': levels
+    }
+
+
+def compare_to_baseline(current, baseline, tolerance=0.2):
+    """Régressions de capacité : débit en baisse, p99 ou mémoire par session en hausse"""
+    reference_levels = {level_key(level): level for level in baseline.get('levels', [])}
+    regressions = []
+    for level in current['levels']:
+        reference = reference_levels.get(level_key(level))
+        if reference is None:
+            continue
+        checks = [
+            ('throughput_rps', reference['throughput_rps'], level['throughput_rps'], False),
+            ('p99_ms', reference['latency']['p99_ms'], level['latency']['p99_ms'], True),
+            ('memory_per_session_mb', reference['memory_per_session_mb'], level['memory_per_session_mb'], True)
+        ]
+        for metric, before, after, higher_is_worse in checks:
+            if before <= 0:
+                continue
+            ratio = after / before
+            if (higher_is_worse and ratio > 1 + tolerance) or (not higher_is_worse and ratio < 1 - tolerance):
+                regressions.append({
+                    'level': level_key(level), 'metric': metric,
+                    'baseline': before, 'current': after, 'ratio': ratio
+                })
+        if level['errors'] > reference['errors']:
+            regressions.append({
+                'level': level_key(level), 'metric': 'errors',
+                'baseline': reference['errors'], 'current': level['errors'],
+                'ratio': level['errors'] / max(reference['errors'], 1)
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge du pipeline et de l'application")
+    parser.add_argument('target', choices=['pipeline', 'app'], help="Cible : pipeline partagé ou sessions Streamlit")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Niveaux de concurrence (boucle fermée) ; avec --rate : taille du pool de workers")
+    parser.add_argument('--rate', type=float, nargs='+',
+                        help="Débits d'arrivée en req/s (boucle ouverte, arrivées poissonniennes)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Durée de chaque niveau (secondes)")
+    parser.add_argument('--mix', nargs='+', metavar='OPERATION=POIDS',
+                        help=f"Mélange d'opérations (pipeline : {', '.join(PIPELINE_MIX)} ; app : {', '.join(APP_MIX)})")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET, help="CSV des projets rejoués")
+    parser.add_argument('--projects', type=int, default=1000, help="Nombre de projets tirés du dataset")
+    parser.add_argument('--warmup', type=int,
+                        help="Requêtes d'échauffement hors mesure par session (défaut : 20 pipeline, 2 app)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help="Dossier des modèles entraînés (cible pipeline)")
+    parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+    parser.add_argument('--save-baseline', help="Enregistre les résultats comme référence")
+    parser.add_argument('--compare', help="Fichier de référence à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Dégradation relative tolérée avant de signaler une régression")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix, PIPELINE_MIX if args.target == 'pipeline' else APP_MIX)
+    except ValueError as e:
+        parser.error(str(e))
+    report = run_load_test(
+        args.target, args.concurrency, rates=args.rate, duration_s=args.duration,
+        mix=mix, dataset=os.path.abspath(args.dataset),
+        n_projects=args.projects, warmup=args.warmup, seed=args.seed, workdir=os.path.abspath(args.workdir)
+    )
+
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, tolerance=args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) de capacité détectée(s) :")
+            for reg in regressions:
+                print(f"  - {reg['level']} {reg['metric']}: "
+                      f"{reg['baseline']:.4g} -> {reg['current']:.4g} (x{reg['ratio']:.2f})")
+            return 1
+        print("\nAucune régression de capacité par rapport à la référence")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,464 @@
+"""Benchmarks des chemins critiques de utils/ et app/orchestration.py
+
+Exemples :
+    python benchmarks/run_benchmarks.py --sizes 1000 10000
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.datasets import write_dataset, row_to_project
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_WORKDIR = os.path.join(ROOT_DIR, 'benchmarks', '.cache')
+
+# Modules dont on mesure le temps d'import à froid
+IMPORT_TARGETS = ['app.inference', 'app.orchestration', 'utils']
+HEAVY_MODULES = ['pandas', 'sklearn', 'mlxtend', 'plotly', 'streamlit']
+
+
+class BenchmarkContext:
+    """Prépare (paresseusement) les données et modèles partagés par les benchmarks d'une taille"""
+
+    def __init__(self, n_rows, workdir, max_calls=1000):
+        self.n_rows = n_rows
+        self.workdir = workdir
+        self.max_calls = max_calls
+        self._cache = {}
+
+    def _get(self, key, factory):
+        if key not in self._cache:
+            self._cache[key] = factory()
+        return self._cache[key]
+
+    @property
+    def filepath(self):
+        return self._get('filepath', lambda: write_dataset(self.n_rows, self.workdir))
+
+    @property
+    def dataset(self):
+        """Données brutes, features encodées et découpage train/test"""
+        def build():
+            from utils.preprocessing import DataPreprocessor
+            preprocessor = DataPreprocessor()
+            X, y, df = preprocessor.preprocess_pipeline(self.filepath)
+            X_train, X_test, y_train, y_test = preprocessor.split_data(X, y)
+            return {
+                'df': df, 'X': X, 'y': y,
+                'X_train': X_train, 'X_test': X_test,
+                'y_train': y_train, 'y_test': y_test
+            }
+        return self._get('dataset', build)
+
+    @property
+    def classifier(self):
+        def build():
+            from utils.classification import CarbonClassifier
+            data = self.dataset
+            classifier = CarbonClassifier()
+            classifier.train_model(data['X_train'], data['y_train'], data['X'].columns.tolist())
+            return classifier
+        return self._get('classifier', build)
+
+    @property
+    def rules_miner(self):
+        def build():
+            from utils.association_rules import AssociationRulesMiner
+            miner = AssociationRulesMiner()
+            miner.mine_association_rules(self.dataset['df'], min_support=0.15, min_confidence=0.6)
+            return miner
+        return self._get('rules_miner', build)
+
+    @property
+    def pipeline(self):
+        def build():
+            from app.orchestration import ProjectEvaluationPipeline
+            pipeline = ProjectEvaluationPipeline()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pipeline.train_models(self.filepath)
+            return pipeline
+        return self._get('pipeline', build)
+
+    @property
+    def projects(self):
+        """Échantillon de projets (dictionnaires) limité à max_calls"""
+        def build():
+            df = self.dataset['df']
+            sample = df.head(min(len(df), self.max_calls))
+            return [row_to_project(row) for _, row in sample.iterrows()]
+        return self._get('projects', build)
+
+    @property
+    def all_projects(self):
+        """Tous les projets du jeu, pour les chemins vectorisables sur tout le dataset"""
+        def build():
+            return [row_to_project(row) for row in self.dataset['df'].to_dict('records')]
+        return self._get('all_projects', build)
+
+
+# Chaque benchmark reçoit le contexte et renvoie la fonction à chronométrer
+
+def bench_preprocess_pipeline(ctx):
+    from utils.preprocessing import DataPreprocessor
+    filepath = ctx.filepath
+    return lambda: DataPreprocessor().preprocess_pipeline(filepath)
+
+
+def bench_train_model(ctx):
+    from utils.classification import CarbonClassifier
+    data = ctx.dataset
+    feature_names = data['X'].columns.tolist()
+    return lambda: CarbonClassifier().train_model(data['X_train'], data['y_train'], feature_names)
+
+
+def bench_predict(ctx):
+    classifier = ctx.classifier
+    X_test = ctx.dataset['X_test']
+    return lambda: classifier.predict(X_test)
+
+
+def bench_decision_path(ctx):
+    classifier = ctx.classifier
+    X_sample = ctx.dataset['X_test'].values[:ctx.max_calls]
+
+    def run():
+        for x in X_sample:
+            classifier.get_decision_path(x)
+    return run
+
+
+def bench_feature_contributions(ctx):
+    classifier = ctx.classifier
+    X_sample = ctx.dataset['X_test'].values[:ctx.max_calls]
+    # Compile l'explicateur (tables pré-calculées) hors de la mesure
+    classifier.get_feature_contributions(X_sample[:1])
+    return lambda: classifier.get_feature_contributions(X_sample)
+
+
+def bench_mine_association_rules(ctx):
+    from utils.association_rules import AssociationRulesMiner
+    df = ctx.dataset['df']
+    return lambda: AssociationRulesMiner().mine_association_rules(df, min_support=0.15, min_confidence=0.6)
+
+
+def bench_get_recommendations_for_project(ctx):
+    miner = ctx.rules_miner
+    projects = ctx.projects
+
+    def run():
+        for project in projects:
+            miner.get_recommendations_for_project(project)
+    return run
+
+
+def bench_calculate_carbon_score(ctx):
+    from utils.scoring_utils import CarbonScorer
+    scorer = CarbonScorer()
+    projects = ctx.all_projects
+
+    def run():
+        for project in projects:
+            scorer.calculate_carbon_score(project)
+    return run
+
+
+def bench_evaluate_single_project(ctx):
+    pipeline = ctx.pipeline
+    projects = ctx.projects
+
+    def run():
+        for project in projects:
+            pipeline.evaluate_single_project(project)
+    return run
+
+
+def bench_compare_projects(ctx):
+    pipeline = ctx.pipeline
+    projects = ctx.projects
+    return lambda: pipeline.compare_projects(projects)
+
+
+def bench_rank_projects(ctx):
+    from utils.result_sink import JsonlSink
+    pipeline = ctx.pipeline
+    projects = ctx.projects
+
+    def run():
+        with JsonlSink('rank_projects.jsonl') as sink:
+            pipeline.rank_projects(iter(projects), k=10, sink=sink)
+    return run
+
+
+def bench_find_green_changes(ctx):
+    pipeline = ctx.pipeline
+    projects = ctx.projects
+    return lambda: pipeline.find_green_changes_batch(projects, target='both')
+
+
+def bench_portfolio_rollups(ctx):
+    from utils.portfolio import PortfolioRollups
+    df = ctx.dataset['df']
+    projects = ctx.projects
+
+    def run():
+        portfolio = PortfolioRollups.from_dataframe(df)
+        # Re-score incrémental d'un échantillon de projets
+        for project_id, project in zip(df['Nom du projet'], projects):
+            portfolio.update(project_id, project)
+    return run
+
+
+def bench_select_portfolio(ctx):
+    from utils.selection import PortfolioSelector
+    df = ctx.dataset['df']
+    selector = PortfolioSelector()
+    # Plafond : 10 % des émissions cumulées des candidats
+    carbon_budget = df['Budget carbone estimé (tCO2e)'].sum() * 0.1
+
+    def run():
+        PortfolioSelector.explain(selector.select_from_dataframe(df, carbon_budget))
+    return run
+
+
+def bench_ingest(ctx):
+    import shutil
+    from utils.ingest import ProjectStore
+    df = ctx.dataset['df']
+    half = len(df) // 2
+
+    def run():
+        shutil.rmtree('ingest_store', ignore_errors=True)
+        store = ProjectStore('ingest_store')
+        # Deux exports qui se recouvrent de moitié
+        store.ingest(df.iloc[:len(df) - half // 2])
+        store.ingest(df.iloc[half:])
+    return run
+
+
+def bench_drift_monitor(ctx):
+    from utils.drift import DriftMonitor
+    projects = ctx.all_projects
+    reference = DriftMonitor().update_dataframe(ctx.dataset['df'])
+
+    def run():
+        # Mise à jour projet par projet (chemin d'évaluation) puis rapport PSI / KS
+        monitor = DriftMonitor()
+        for project in projects:
+            monitor.update(project)
+        monitor.report(reference)
+    return run
+
+
+BENCHMARKS = {
+    'preprocess_pipeline': bench_preprocess_pipeline,
+    'train_model': bench_train_model,
+    'predict': bench_predict,
+    'decision_path': bench_decision_path,
+    'feature_contributions': bench_feature_contributions,
+    'mine_association_rules': bench_mine_association_rules,
+    'get_recommendations_for_project': bench_get_recommendations_for_project,
+    'calculate_carbon_score': bench_calculate_carbon_score,
+    'evaluate_single_project': bench_evaluate_single_project,
+    'compare_projects': bench_compare_projects,
+    'rank_projects': bench_rank_projects,
+    'find_green_changes': bench_find_green_changes,
+    'portfolio_rollups': bench_portfolio_rollups,
+    'select_portfolio': bench_select_portfolio,
+    'ingest': bench_ingest,
+    'drift_monitor': bench_drift_monitor,
+}
+
+
+def measure_import_time(module_name, repeat=3):
+    """Mesure le temps d'import à froid d'un module dans un interpréteur neuf"""
+    code = (
+        "import sys, time, json\n"
+        f"sys.path.insert(0, {ROOT_DIR!r})\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'time_s': elapsed, 'heavy_modules': heavy}))\n"
+    )
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        measurement = json.loads(output.stdout.strip().splitlines()[-1])
+        timings.append(measurement['time_s'])
+
+    return {
+        'time_s': min(timings),
+        'time_median_s': statistics.median(timings),
+        'heavy_modules': measurement['heavy_modules'],
+        'repeat': repeat
+    }
+
+
+def measure(func, repeat=3):
+    """Mesure le temps (min/médiane) et le pic mémoire Python d'une fonction"""
+    # Passe instrumentée séparée : tracemalloc ralentit l'exécution
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'time_s': min(timings),
+        'time_median_s': statistics.median(timings),
+        'peak_mb': peak / 1024 ** 2,
+        'repeat': repeat
+    }
+
+
+def run_benchmarks(sizes, selected=None, repeat=3, workdir=DEFAULT_WORKDIR, max_calls=1000):
+    """Exécute les benchmarks pour chaque taille de dataset"""
+    os.makedirs(workdir, exist_ok=True)
+    # Les modèles entraînés par le pipeline sont écrits dans workdir/models
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    results = {}
+    try:
+        for n_rows in sizes:
+            ctx = BenchmarkContext(n_rows, workdir, max_calls=max_calls)
+            results[str(n_rows)] = {}
+            for name, factory in BENCHMARKS.items():
+                if selected and name not in selected:
+                    continue
+                with contextlib.redirect_stdout(io.StringIO()):
+                    func = factory(ctx)
+                    measurement = measure(func, repeat=repeat)
+                results[str(n_rows)][name] = measurement
+                print(f"{n_rows:>9} lignes | {name:<32} {measurement['time_s'] * 1000:>10.1f} ms"
+                      f" | pic {measurement['peak_mb']:>8.1f} Mo")
+    finally:
+        os.chdir(previous_cwd)
+
+    imports = {}
+    for module_name in IMPORT_TARGETS:
+        imports[module_name] = measure_import_time(module_name, repeat=repeat)
+        print(f"import {module_name:<24} {imports[module_name]['time_s'] * 1000:>10.1f} ms"
+              f" | modules lourds : {', '.join(imports[module_name]['heavy_modules']) or 'aucun'}")
+
+    return {
+        'meta': _environment_metadata(max_calls),
+        'results': results,
+        'imports': imports
+    }
+
+
+def _environment_metadata(max_calls):
+    versions = {}
+    for module_name in ['numpy', 'pandas', 'sklearn', 'mlxtend']:
+        try:
+            versions[module_name] = __import__(module_name).__version__
+        except ImportError:
+            versions[module_name] = None
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'max_calls': max_calls,
+        'versions': versions
+    }
+
+
+def compare_to_baseline(current, baseline, tolerance=0.2):
+    """Retourne la liste des régressions (temps ou mémoire) par rapport à la référence"""
+    regressions = []
+    for module_name, measurement in current.get('imports', {}).items():
+        reference = baseline.get('imports', {}).get(module_name)
+        if reference and reference['time_s'] > 0 and measurement['time_s'] / reference['time_s'] > 1 + tolerance:
+            regressions.append({
+                'size': 'import',
+                'benchmark': module_name,
+                'metric': 'time_s',
+                'baseline': reference['time_s'],
+                'current': measurement['time_s'],
+                'ratio': measurement['time_s'] / reference['time_s']
+            })
+    for size, benchmarks in current['results'].items():
+        for name, measurement in benchmarks.items():
+            reference = baseline.get('results', {}).get(size, {}).get(name)
+            if reference is None:
+                continue
+            for metric in ['time_s', 'peak_mb']:
+                if reference[metric] <= 0:
+                    continue
+                ratio = measurement[metric] / reference[metric]
+                if ratio > 1 + tolerance:
+                    regressions.append({
+                        'size': size,
+                        'benchmark': name,
+                        'metric': metric,
+                        'baseline': reference[metric],
+                        'current': measurement[metric],
+                        'ratio': ratio
+                    })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline d'évaluation carbone")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Tailles des jeux synthétiques (nombre de lignes)")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="Benchmarks à exécuter")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre de répétitions chronométrées")
+    parser.add_argument('--max-calls', type=int, default=1000,
+                        help="Nombre de projets pour les benchmarks appelés projet par projet")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help="Dossier des données et modèles générés")
+    parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+    parser.add_argument('--save-baseline', help="Enregistre les résultats comme référence")
+    parser.add_argument('--compare', help="Fichier de référence à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Dégradation relative tolérée avant de signaler une régression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, selected=args.only, repeat=args.repeat,
+                            workdir=os.path.abspath(args.workdir), max_calls=args.max_calls)
+
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, tolerance=args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) détectée(s) :")
+            for reg in regressions:
+                print(f"  - {reg['benchmark']} ({reg['size']} lignes) {reg['metric']}: "
+                      f"{reg['baseline']:.4g} -> {reg['current']:.4g} (x{reg['ratio']:.2f})")
+            return 1
+        print("\nAucune régression par rapport à la référence")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
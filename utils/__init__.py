@@ -0,0 +1,36 @@
+"""Outils d'évaluation carbone
+
+Les classes sont chargées à la première utilisation : importer `utils` (ou un seul de
+ses modules) n'importe pas pandas, sklearn ou mlxtend tant qu'ils ne sont pas nécessaires.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'DataPreprocessor': 'utils.preprocessing',
+    'CarbonScorer': 'utils.scoring_utils',
+    'CarbonClassifier': 'utils.classification',
+    'AssociationRulesMiner': 'utils.association_rules',
+    'MetricsRegistry': 'utils.metrics',
+    'SlowRequestProfiler': 'utils.profiling',
+    'TreeArrays': 'utils.tree_arrays',
+    'TreeExplainer': 'utils.tree_explainer',
+    'CounterfactualSearch': 'utils.counterfactual',
+    'PortfolioRollups': 'utils.portfolio',
+    'PortfolioSelector': 'utils.selection',
+    'DriftMonitor': 'utils.drift',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'utils' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,86 +1,260 @@
-import pandas as pd
+import pickle
 import numpy as np
-from mlxtend.frequent_patterns import apriori, association_rules
-from mlxtend.preprocessing import TransactionEncoder
+from utils.schema import PROJECT_FIELDS
+
+# pandas et mlxtend sont importés à la première utilisation (démarrage plus rapide)
+
+MAX_CACHED_DATASETS = 8
+
+# Colonne du dataset -> item de transaction qui en est dérivé (voir _transaction_items)
+TRANSACTION_ITEM_COLUMNS = {
+    'Secteur': 'secteur',
+    'Énergie utilisée': 'energie',
+    'Type de transport': 'transport',
+    'Fréquence transport': 'frequence',
+    'Matériaux': 'materiaux',
+    'Distance transport (km)': 'distance',
+    'Taille de l\'équipe / locaux': 'equipe'
+}
+
+
+def _derive_rules(frequent_itemsets, min_support, metric, min_threshold):
+    """Dérive les règles d'un seuil donné en filtrant des itemsets extraits à un support plus faible"""
+    import pandas as pd
+    from mlxtend.frequent_patterns import association_rules
+    
+    # Tout sous-ensemble d'un itemset de support >= min_support a aussi un support >= min_support :
+    # le filtrage donne exactement les itemsets qu'aurait produits apriori(min_support)
+    itemsets = frequent_itemsets[frequent_itemsets['support'] >= min_support].reset_index(drop=True)
+    if len(itemsets) == 0:
+        return pd.DataFrame()
+    return association_rules(itemsets, metric=metric, min_threshold=min_threshold)
+
+
+def _mine_segment(segment_df, min_support, min_confidence, segment_column):
+    """Extrait les règles d'un segment (exécuté dans un processus du pool)
+    
+    L'item de la colonne de segmentation est présent dans toutes les transactions du
+    segment : les règles qui le contiennent (confiance triviale de 1.0) sont écartées.
+    """
+    miner = AssociationRulesMiner()
+    rules = miner.mine_association_rules(segment_df, min_support=min_support, min_confidence=min_confidence)
+    item_column = TRANSACTION_ITEM_COLUMNS.get(segment_column)
+    if item_column is None or len(rules) == 0:
+        return rules
+    segment_items = set(miner._transaction_items(segment_df)[item_column])
+    keep = [
+        not (segment_items & (antecedents | consequents))
+        for antecedents, consequents in zip(rules['antecedents'], rules['consequents'])
+    ]
+    return rules[keep].reset_index(drop=True)
+
+
+def _build_rule_index(rules):
+    """Pré-calcule (antécédents, conséquents, confiance) triés par confiance décroissante"""
+    if rules is None or len(rules) == 0:
+        return []
+    index = [
+        (frozenset(antecedents), frozenset(consequents), confidence)
+        for antecedents, consequents, confidence in zip(rules['antecedents'], rules['consequents'], rules['confidence'])
+    ]
+    # Tri stable : à confiance égale, l'ordre des règles est conservé
+    index.sort(key=lambda rule: rule[2], reverse=True)
+    return index
+
 
 class AssociationRulesMiner:
-    def __init__(self):
+    def __init__(self, metrics=None):
+        self.metrics = metrics
         self.rules = None
         self.frequent_itemsets = None
+        # Itemsets fréquents par jeu de données : {empreinte: (support minimal extrait, itemsets)}
+        self._itemsets_cache = {}
+        # Règles par segment (ex: par secteur) et index de recherche associés
+        self.segment_column = None
+        self.segment_rules = {}
+        self._segment_index = {}
+        self._global_index = (None, [])
+    
+    def _transaction_items(self, df):
+        """Calcule les items de chaque transaction (une colonne par caractéristique)"""
+        import pandas as pd
+        budget = df['Budget carbone estimé (tCO2e)']
+        distance = df['Distance transport (km)']
+        team_size = df['Taille de l\'équipe / locaux']
         
-    def prepare_data_for_mining(self, df):
-        """Prépare les données pour l'extraction de règles d'association"""
-        # Convertit les données en format transactionnel
-        transactions = []
-        
-        for _, row in df.iterrows():
-            transaction = []
-            
-            # Catégorises les variables
-            if row['Budget carbone estimé (tCO2e)'] > 200:
-                transaction.append('Haute_Emission')
-            elif row['Budget carbone estimé (tCO2e)'] > 50:
-                transaction.append('Moyenne_Emission')
-            else:
-                transaction.append('Faible_Emission')
-            
+        return pd.DataFrame({
+            # Catégorise les émissions
+            'emission': np.select([budget > 200, budget > 50], ['Haute_Emission', 'Moyenne_Emission'], 'Faible_Emission'),
             # Ajoute les caractéristiques
-            transaction.extend([
-                f"Secteur_{row['Secteur']}",
-                f"Energie_{row['Énergie utilisée']}",
-                f"Transport_{row['Type de transport']}",
-                f"Frequence_{row['Fréquence transport']}",
-                f"Materiaux_{row['Matériaux'].split(',')[0].strip()}"
-            ])
-            
+            'secteur': 'Secteur_' + df['Secteur'].astype(str),
+            'energie': 'Energie_' + df['Énergie utilisée'].astype(str),
+            'transport': 'Transport_' + df['Type de transport'].astype(str),
+            'frequence': 'Frequence_' + df['Fréquence transport'].astype(str),
+            'materiaux': 'Materiaux_' + df['Matériaux'].astype(str).str.split(',').str[0].str.strip(),
             # Catégories de distance
-            if row['Distance transport (km)'] > 2000:
-                transaction.append('Longue_Distance')
-            elif row['Distance transport (km)'] > 500:
-                transaction.append('Moyenne_Distance')
-            else:
-                transaction.append('Courte_Distance')
-            
+            'distance': np.select([distance > 2000, distance > 500], ['Longue_Distance', 'Moyenne_Distance'], 'Courte_Distance'),
             # Catégories d'équipe
-            if row['Taille de l\'équipe / locaux'] > 100:
-                transaction.append('Grande_Equipe')
-            elif row['Taille de l\'équipe / locaux'] > 20:
-                transaction.append('Moyenne_Equipe')
-            else:
-                transaction.append('Petite_Equipe')
-            
-            transactions.append(transaction)
+            'equipe': np.select([team_size > 100, team_size > 20], ['Grande_Equipe', 'Moyenne_Equipe'], 'Petite_Equipe')
+        }, index=df.index)
         
-        return transactions
+    def prepare_data_for_mining(self, df):
+        """Prépare les données pour l'extraction de règles d'association"""
+        # Convertit les données en format transactionnel
+        return self._transaction_items(df).values.tolist()
     
-    def mine_association_rules(self, df, min_support=0.1, min_confidence=0.6):
-        """Extrait les règles d'association"""
-        # Prépare les données
-        transactions = self.prepare_data_for_mining(df)
+    def encode_transactions(self, df):
+        """Encode les transactions en matrice booléenne (une colonne par item, triées)"""
+        import pandas as pd
+        one_hot = pd.get_dummies(self._transaction_items(df), prefix='', prefix_sep='').astype(bool)
+        return one_hot.reindex(sorted(one_hot.columns), axis=1).reset_index(drop=True)
+    
+    @staticmethod
+    def _dataset_fingerprint(df):
+        """Empreinte du contenu des données (clé du cache d'itemsets)"""
+        import pandas as pd
+        return len(df), int(pd.util.hash_pandas_object(df, index=False).values.sum())
+    
+    def mine_frequent_itemsets(self, df, min_support=0.1):
+        """Extrait les itemsets fréquents, en réutilisant une extraction à support plus faible si possible"""
+        fingerprint = self._dataset_fingerprint(df)
+        cached = self._itemsets_cache.get(fingerprint)
+        if cached is not None and cached[0] <= min_support:
+            if self.metrics is not None:
+                self.metrics.inc('itemsets_cache_hits')
+            itemsets = cached[1]
+            return itemsets[itemsets['support'] >= min_support].reset_index(drop=True)
         
-        # Encode les transactions
-        te = TransactionEncoder()
-        te_array = te.fit(transactions).transform(transactions)
-        df_encoded = pd.DataFrame(te_array, columns=te.columns_)
+        from mlxtend.frequent_patterns import apriori
+        if self.metrics is not None:
+            self.metrics.inc('itemsets_cache_misses')
         
         # Trouve les itemsets fréquents
-        self.frequent_itemsets = apriori(df_encoded, min_support=min_support, use_colnames=True)
+        itemsets = apriori(self.encode_transactions(df), min_support=min_support, use_colnames=True)
+        
+        if len(self._itemsets_cache) >= MAX_CACHED_DATASETS and fingerprint not in self._itemsets_cache:
+            self._itemsets_cache.pop(next(iter(self._itemsets_cache)))
+        self._itemsets_cache[fingerprint] = (min_support, itemsets)
+        return itemsets
+    
+    def mine_association_rules(self, df, min_support=0.1, min_confidence=0.6):
+        """Extrait les règles d'association"""
+        import pandas as pd
+        # Trouve les itemsets fréquents (extraits une seule fois par jeu de données)
+        self.frequent_itemsets = self.mine_frequent_itemsets(df, min_support=min_support)
         
         if len(self.frequent_itemsets) == 0:
-            return pd.DataFrame()
+            self.rules = pd.DataFrame()
+            return self.rules
         
         # Extrait les règles d'association
-        self.rules = association_rules(
-            self.frequent_itemsets, 
-            metric="confidence", 
-            min_threshold=min_confidence
-        )
+        self.rules = _derive_rules(self.frequent_itemsets, min_support, 'confidence', min_confidence)
         
         return self.rules
     
+    def mine_rules_grid(self, df, grid, n_jobs=None):
+        """Extrait les règles pour plusieurs combinaisons de seuils
+        
+        `grid` est une liste de dictionnaires {'min_support', 'metric', 'min_threshold'}
+        (metric : 'confidence', 'lift', 'leverage', ...). Les itemsets sont extraits une seule
+        fois au support le plus faible, puis chaque combinaison est dérivée par filtrage,
+        en parallèle sur plusieurs processus si n_jobs > 1 (None : tous les cœurs).
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        
+        combinations = [
+            (params['min_support'], params.get('metric', 'confidence'), params.get('min_threshold', 0.6))
+            for params in grid
+        ]
+        if not combinations:
+            return {}
+        
+        itemsets = self.mine_frequent_itemsets(df, min_support=min(c[0] for c in combinations))
+        
+        if n_jobs == 1 or len(combinations) == 1:
+            rules = [_derive_rules(itemsets, *combination) for combination in combinations]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [executor.submit(_derive_rules, itemsets, *combination) for combination in combinations]
+                rules = [future.result() for future in futures]
+        
+        return dict(zip(combinations, rules))
+    
+    def mine_segmented_rules(self, df, segment_column='Secteur', min_support=0.15, min_confidence=0.6,
+                             segment_support=None, n_jobs=None):
+        """Extrait des règles indépendantes pour chaque valeur de `segment_column`
+        
+        Chaque segment est miné dans un processus du pool avec son propre seuil de support
+        (`segment_support` : {segment: support}, sinon `min_support`). Les recommandations
+        d'un projet sont ensuite tirées uniquement des règles de son segment.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        
+        if segment_column not in self._segment_keys():
+            raise ValueError(f"Colonne de segmentation non supportée: {segment_column}")
+        segment_support = segment_support or {}
+        
+        segments = [(value, segment_df) for value, segment_df in df.groupby(segment_column, sort=True)]
+        arguments = [
+            (segment_df, segment_support.get(value, min_support), min_confidence, segment_column)
+            for value, segment_df in segments
+        ]
+        
+        if n_jobs == 1 or len(segments) <= 1:
+            rules = [_mine_segment(*args) for args in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [executor.submit(_mine_segment, *args) for args in arguments]
+                rules = [future.result() for future in futures]
+        
+        self._set_segment_rules(segment_column, {value: segment_rules for (value, _), segment_rules in zip(segments, rules)})
+        return self.segment_rules
+    
+    def _set_segment_rules(self, segment_column, segment_rules):
+        self.segment_column = segment_column
+        self.segment_rules = segment_rules
+        self._segment_index = {value: _build_rule_index(rules) for value, rules in segment_rules.items()}
+    
+    def save_segment_rules(self, filepath):
+        """Sauvegarde la colonne de segmentation et les règles par segment"""
+        with open(filepath, 'wb') as f:
+            pickle.dump({'segment_column': self.segment_column, 'segment_rules': self.segment_rules}, f)
+    
+    def load_segment_rules(self, filepath):
+        """Restaure les règles par segment sauvegardées (False si le fichier n'existe pas)"""
+        try:
+            with open(filepath, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        self._set_segment_rules(data['segment_column'], data['segment_rules'])
+        return True
+    
+    @staticmethod
+    def _segment_keys():
+        """Colonnes de segmentation possibles -> (clé du projet, valeur par défaut)"""
+        return {column: (key, default) for key, column, default in PROJECT_FIELDS}
+    
+    def _rules_for_project(self, project_data):
+        """Retourne l'index de règles à parcourir : celui du segment du projet s'il existe"""
+        if self.segment_column is not None:
+            key, default = self._segment_keys()[self.segment_column]
+            # Segment inconnu ou sans règle : règles globales
+            segment_index = self._segment_index.get(project_data.get(key, default))
+            if segment_index:
+                return segment_index
+        
+        if self.rules is None or len(self.rules) == 0:
+            return None
+        # Index global reconstruit uniquement si les règles ont changé
+        if self._global_index[0] is not self.rules:
+            self._global_index = (self.rules, _build_rule_index(self.rules))
+        return self._global_index[1]
+    
     def get_recommendations_for_project(self, project_data, top_n=5):
         """Génère des recommandations basées sur les règles d'association"""
-        if self.rules is None or len(self.rules) == 0:
+        rule_index = self._rules_for_project(project_data)
+        if rule_index is None:
             return ["Aucune recommandation disponible basée sur les règles d'association"]
         
         recommendations = []
@@ -102,22 +276,21 @@ class AssociationRulesMiner:
         project_characteristics.add(f"Transport_{project_data.get('transport_type', 'routier')}")
         project_characteristics.add(f"Frequence_{project_data.get('frequency', 'mensuelle')}")
         
-        # Trouve les règles applicables
+        # Trouve les règles applicables (l'index est déjà trié par confiance décroissante)
         applicable_rules = []
-        for _, rule in self.rules.iterrows():
-            antecedents = set(rule['antecedents'])
+        rules_scanned = 0
+        for antecedents, consequents, confidence in rule_index:
+            rules_scanned += 1
             if antecedents.issubset(project_characteristics):
-                applicable_rules.append(rule)
+                applicable_rules.append((consequents, confidence))
+                if len(applicable_rules) == top_n:
+                    break
+        if self.metrics is not None:
+            self.metrics.inc('rules_scanned', rules_scanned)
         
         # Génère des recommandations basées sur les règles
         if applicable_rules:
-            # Trie par confiance décroissante
-            applicable_rules = sorted(applicable_rules, key=lambda x: x['confidence'], reverse=True)
-            
-            for rule in applicable_rules[:top_n]:
-                consequents = list(rule['consequents'])
-                confidence = rule['confidence']
-                
+            for consequents, confidence in applicable_rules:
                 if 'Haute_Emission' in consequents:
                     recommendations.append(
                         f"Attention: Configuration à haut risque d'émissions élevées (confiance: {confidence:.2f})"
@@ -1,43 +1,92 @@
-import pandas as pd
 import numpy as np
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.metrics import classification_report, accuracy_score
 import pickle
 import os
+from utils.tree_arrays import TreeArrays
+from utils.tree_explainer import TreeExplainer
+
+# pandas et sklearn sont importés à la première utilisation (démarrage plus rapide)
 
 class CarbonClassifier:
     def __init__(self):
-        self.model = DecisionTreeClassifier(
+        self.model = self._new_tree()
+        self.feature_names = []
+        self.is_trained = False
+        # Arbres ajoutés lors des rafraîchissements incrémentaux : [(arbre, poids)]
+        self.n_train_samples = 0
+        self.refresh_models = []
+        # Explicateur (tables de contributions pré-calculées), reconstruit quand le modèle change
+        self._explainer = None
+    
+    @staticmethod
+    def _new_tree():
+        from sklearn.tree import DecisionTreeClassifier
+        return DecisionTreeClassifier(
             max_depth=10,
             min_samples_split=5,
             min_samples_leaf=2,
             random_state=42
         )
-        self.feature_names = []
-        self.is_trained = False
     
     def train_model(self, X_train, y_train, feature_names=None):
         """Entraîne le modèle d'arbre de décision"""
         self.feature_names = feature_names if feature_names else [f"feature_{i}" for i in range(X_train.shape[1])]
         self.model.fit(X_train, y_train)
+        self.n_train_samples = len(X_train)
+        self.refresh_models = []
+        self._explainer = None
         self.is_trained = True
         
         return self.model
     
+    def refresh_model(self, X_new, y_new):
+        """Ajoute à l'ensemble un arbre entraîné uniquement sur les nouvelles données
+        
+        Le coût est proportionnel au lot de nouvelles données ; les prédictions deviennent la
+        moyenne des arbres pondérée par leur nombre d'échantillons d'entraînement.
+        """
+        if not self.is_trained:
+            raise ValueError("Le modèle n'est pas encore entraîné")
+        
+        tree = self._new_tree()
+        tree.fit(X_new, y_new)
+        self.refresh_models.append((tree, len(X_new)))
+        self._explainer = None
+        
+        return tree
+    
+    def _ensemble(self):
+        """Retourne les arbres de l'ensemble et leurs poids"""
+        return [(self.model, max(self.n_train_samples, 1))] + list(self.refresh_models)
+    
     def predict(self, X):
         """Fait des prédictions"""
         if not self.is_trained:
             raise ValueError("Le modèle n'est pas encore entraîné")
-        return self.model.predict(X)
+        if not self.refresh_models:
+            return self.model.predict(X)
+        return self.model.classes_[np.argmax(self.predict_proba(X), axis=1)]
     
     def predict_proba(self, X):
         """Retourne les probabilités de prédiction"""
         if not self.is_trained:
             raise ValueError("Le modèle n'est pas encore entraîné")
-        return self.model.predict_proba(X)
+        if not self.refresh_models:
+            return self.model.predict_proba(X)
+        
+        # Moyenne pondérée des arbres, alignée sur les classes du modèle initial
+        classes = self.model.classes_
+        probabilities = np.zeros((len(X), len(classes)))
+        total_weight = 0
+        for tree, weight in self._ensemble():
+            known = np.isin(tree.classes_, classes)
+            columns = np.searchsorted(classes, tree.classes_[known])
+            probabilities[:, columns] += weight * tree.predict_proba(X)[:, known]
+            total_weight += weight
+        return probabilities / total_weight
     
     def get_feature_importance(self):
         """Retourne l'importance des features"""
+        import pandas as pd
         if not self.is_trained:
             raise ValueError("Le modèle n'est pas encore entraîné")
         
@@ -52,6 +101,7 @@ class CarbonClassifier:
         """Évalue le modèle"""
         if not self.is_trained:
             raise ValueError("Le modèle n'est pas encore entraîné")
+        from sklearn.metrics import classification_report, accuracy_score
         
         predictions = self.predict(X_test)
         accuracy = accuracy_score(y_test, predictions)
@@ -63,6 +113,32 @@ class CarbonClassifier:
             'predictions': predictions
         }
     
+    def get_tree_arrays(self):
+        """Retourne l'arbre sous forme de tableaux NumPy (inférence sans sklearn)"""
+        if not self.is_trained:
+            raise ValueError("Le modèle n'est pas encore entraîné")
+        return TreeArrays.from_sklearn(self.model)
+    
+    def get_ensemble_tree_arrays(self):
+        """Retourne tous les arbres (initial et rafraîchissements) en tableaux NumPy et leurs poids"""
+        if not self.is_trained:
+            raise ValueError("Le modèle n'est pas encore entraîné")
+        ensemble = self._ensemble()
+        return [TreeArrays.from_sklearn(tree) for tree, _ in ensemble], [weight for _, weight in ensemble]
+    
+    def get_feature_contributions(self, X):
+        """Contributions exactes de chaque feature aux probabilités prédites
+        
+        Retourne un tableau (n_échantillons, n_features, n_classes) dont la somme sur les
+        features plus la valeur de référence donne predict_proba.
+        """
+        if not self.is_trained:
+            raise ValueError("Le modèle n'est pas encore entraîné")
+        if self._explainer is None:
+            trees, weights = self.get_ensemble_tree_arrays()
+            self._explainer = TreeExplainer(trees, len(self.feature_names), weights)
+        return self._explainer.shap_values(np.asarray(X, dtype=np.float64))
+    
     def save_model(self, filepath):
         """Sauvegarde le modèle"""
         if not self.is_trained:
@@ -71,7 +147,9 @@ class CarbonClassifier:
         model_data = {
             'model': self.model,
             'feature_names': self.feature_names,
-            'is_trained': self.is_trained
+            'is_trained': self.is_trained,
+            'n_train_samples': self.n_train_samples,
+            'refresh_models': self.refresh_models
         }
         
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
@@ -87,6 +165,10 @@ class CarbonClassifier:
             self.model = model_data['model']
             self.feature_names = model_data['feature_names']
             self.is_trained = model_data['is_trained']
+            # Modèles sauvegardés avant l'ensemble : taille d'entraînement lue à la racine de l'arbre
+            self.n_train_samples = model_data.get('n_train_samples', int(self.model.tree_.n_node_samples[0]))
+            self.refresh_models = model_data.get('refresh_models', [])
+            self._explainer = None
             
             return True
         except FileNotFoundError:
@@ -0,0 +1,340 @@
+import time
+import numpy as np
+from utils.schema import CATEGORICAL_COLUMNS, PROJECT_FIELDS
+
+GREEN_THRESHOLD = 30
+TARGETS = ('score', 'model', 'both')
+
+# Entrées modifiables : clé projet -> colonne du dataset
+MUTABLE_FIELDS = {
+    'energie': 'Énergie utilisée',
+    'transport_type': 'Type de transport',
+    'frequency': 'Fréquence transport',
+    'materials': 'Matériaux',
+    'distance': 'Distance transport (km)'
+}
+
+DEFAULT_CHANGE_COSTS = {
+    'energie': 1.0,
+    'transport_type': 1.0,
+    'frequency': 1.0,
+    'materials': 1.0,
+    # Coût d'une suppression totale de la distance (proportionnel à la réduction relative)
+    'distance': 1.0
+}
+
+# Variables catégorielles explorées par séparation-évaluation (la distance est résolue analytiquement)
+_BRANCH_KEYS = ['energie', 'materials', 'transport_type', 'frequency']
+
+
+def _float32_floor(value):
+    """Plus grand float32 inférieur ou égal à value (inchangé par la conversion float32 de l'arbre)"""
+    rounded = np.float32(value)
+    if rounded > value:
+        rounded = np.nextafter(rounded, np.float32(-np.inf))
+    return float(rounded)
+
+
+class CounterfactualSearch:
+    """Recherche du changement d'entrées le moins coûteux pour passer un projet en catégorie 'Vert'
+
+    Cibles : 'score' (score carbone <= 30), 'model' (prédiction du classificateur 'Vert')
+    ou 'both'. Le score est une somme de composantes pré-calculées par modalité
+    (énergie, matériaux, transport x fréquence x distance) : la recherche par
+    séparation-évaluation élague avec une borne inférieure du score et du coût, et la
+    distance est fixée analytiquement (plus grande distance respectant les contraintes).
+    Pour le classificateur, l'espace est découpé selon les feuilles 'Vert' de l'arbre
+    principal, explorées par borne inférieure de coût croissante, et chaque solution est
+    vérifiée sur le modèle complet (arbres de rafraîchissement compris). Si cette
+    vérification écarte un candidat, la solution retenue n'est plus garantie optimale
+    (complete=False).
+    """
+
+    def __init__(self, scorer, trees=None, weights=None, feature_names=None, vocabularies=None,
+                 change_costs=None, time_budget_s=0.05):
+        # Facteurs figés : les composantes pré-calculées restent valides pour cette version
+        self.scorer = scorer.snapshot()
+        self.factors_version = self.scorer.factors_version
+        self.change_costs = dict(DEFAULT_CHANGE_COSTS, **(change_costs or {}))
+        self.time_budget_s = time_budget_s
+        self.vocabularies = vocabularies or {}
+        self.trees = list(trees) if trees else []
+        self.weights = np.ones(len(self.trees)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.feature_names = list(feature_names or [])
+        self._code_maps = {
+            col: {value: code for code, value in enumerate(values)}
+            for col, values in self.vocabularies.items()
+        }
+        self._defaults = {key: default for key, _, default in PROJECT_FIELDS}
+        keys = {column: key for key, column, _ in PROJECT_FIELDS}
+        self._feature_keys = [keys[name] for name in self.feature_names]
+
+        # Modalités candidates de chaque variable et composantes de score associées
+        material_candidates = self.vocabularies.get(MUTABLE_FIELDS['materials']) or list(self.scorer.material_factors)
+        self._candidates = {
+            'energie': list(self.scorer.energy_factors),
+            'transport_type': list(self.scorer.transport_factors),
+            'frequency': list(self.scorer.frequency_factors),
+            'materials': list(material_candidates)
+        }
+        self._candidate_parts = {
+            key: {value: self._score_parts(key, value) for value in values}
+            for key, values in self._candidates.items()
+        }
+
+        if self.trees:
+            self._leaf_boxes = self._vert_leaf_boxes(self.trees[0])
+
+    def _vert_leaf_boxes(self, tree):
+        """Bornes (basse exclue, haute incluse) de chaque feature pour les feuilles prédisant 'Vert'"""
+        n_features = len(self.feature_names)
+        lows, highs = [], []
+        stack = [(0, np.full(n_features, -np.inf), np.full(n_features, np.inf))]
+        while stack:
+            node, low, high = stack.pop()
+            if tree.is_leaf[node]:
+                if tree.classes[np.argmax(tree.value[node])] == 'Vert':
+                    lows.append(low)
+                    highs.append(high)
+                continue
+            feature, threshold = tree.feature[node], tree.threshold[node]
+            left_high = high.copy()
+            left_high[feature] = min(high[feature], threshold)
+            right_low = low.copy()
+            right_low[feature] = max(low[feature], threshold)
+            stack.append((tree.children_left[node], low, left_high))
+            stack.append((tree.children_right[node], right_low, high))
+        if not lows:
+            return np.zeros((0, n_features)), np.zeros((0, n_features))
+        return np.array(lows), np.array(highs)
+
+    def _encode(self, project):
+        """Encode un projet en vecteur de features (mêmes codes que DataPreprocessor)"""
+        x = np.empty(len(self.feature_names))
+        for j, (name, key) in enumerate(zip(self.feature_names, self._feature_keys)):
+            value = project.get(key, self._defaults[key])
+            x[j] = self._code_maps.get(name, {}).get(value, 0) if name in CATEGORICAL_COLUMNS else value
+        return x
+
+    def _predict(self, project):
+        """Classe prédite par l'ensemble (moyenne pondérée des arbres)"""
+        x = self._encode(project)[None, :]
+        classes = self.trees[0].classes
+        probabilities = np.zeros(len(classes))
+        for tree, weight in zip(self.trees, self.weights):
+            probabilities[np.searchsorted(classes, tree.classes)] += weight * tree.predict_proba(x)[0]
+        return str(classes[np.argmax(probabilities)])
+
+    def _score_parts(self, key, value):
+        """Composante de score (ou facteur multiplicatif pour le transport) d'une modalité"""
+        factors = self.scorer.factors
+        if key == 'energie':
+            return factors.factor('energy', value) * 25
+        if key == 'materials':
+            materials = value.split(', ')
+            return np.mean([factors.factor('material', m.strip()) for m in materials]) * 15
+        if key == 'transport_type':
+            return factors.factor('transport', value)
+        return factors.factor('frequency', value)
+
+    def _options(self, project):
+        """Options (coût, valeur, composante) de chaque variable, l'existant en premier à coût nul"""
+        options = {}
+        for key in _BRANCH_KEYS:
+            current = project.get(key, self._defaults[key])
+            values = [current] + [value for value in self._candidates[key] if value != current]
+            parts = self._candidate_parts[key]
+            options[key] = [
+                (0.0 if value == current else self.change_costs[key], value,
+                 parts[value] if value in parts else self._score_parts(key, value))
+                for value in values
+            ]
+        return options
+
+    def search(self, project_data, target='score', time_budget_s=None):
+        """Changement minimal (en coût) pour passer le projet en 'Vert'
+
+        time_budget_s : budget de temps de cet appel (par défaut celui de l'instance).
+        """
+        if time_budget_s is None:
+            time_budget_s = self.time_budget_s
+        return self._search(project_data, target, self._options(project_data), time_budget_s)
+
+    def search_batch(self, projects, target='score', time_budget_s=None):
+        """Recherche pour un portefeuille (budget de temps par projet)"""
+        return [self.search(project, target, time_budget_s) for project in projects]
+
+    def _search(self, project, target, options, time_budget_s):
+        if target not in TARGETS:
+            raise ValueError(f"Cible inconnue : {target} (attendu : {', '.join(TARGETS)})")
+        use_model = target in ('model', 'both')
+        if use_model and not self.trees:
+            raise ValueError("Aucun modèle de classification disponible pour la recherche")
+
+        deadline = time.perf_counter() + time_budget_s
+        need_score = target in ('score', 'both')
+        distance = float(project.get('distance', self._defaults['distance']))
+
+        # Composantes non modifiables du score (secteur, équipe, durée)
+        fixed_factors = self.scorer.get_impact_factors(project)
+        fixed_score = fixed_factors['Secteur'] + fixed_factors['Équipe'] + fixed_factors['Durée']
+
+        if use_model:
+            regions = self._model_regions(project, options, distance)
+        else:
+            regions = [(0.0, options, -np.inf, np.inf)]
+
+        best = {'cost': np.inf, 'project': None}
+        complete, timed_out = True, False
+        for lower_bound, region_options, distance_low, distance_high in regions:
+            if lower_bound >= best['cost']:
+                break
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+            state = {'best': best, 'deadline': deadline, 'timed_out': False, 'rejected': False}
+            self._branch(project, region_options, 0, 0.0, {}, fixed_score, need_score,
+                         distance, distance_low, distance_high, use_model, state)
+            if state['rejected']:
+                complete = False
+            if state['timed_out']:
+                timed_out = True
+                break
+
+        return self._result(project, best, complete and not timed_out, timed_out, use_model)
+
+    def _model_regions(self, project, options, distance):
+        """Feuilles 'Vert' compatibles avec les entrées fixes, triées par borne inférieure de coût"""
+        lows, highs = self._leaf_boxes
+        # L'arbre compare les entrées converties en float32
+        x = self._encode(project).astype(np.float32)
+        distance32 = np.float32(distance)
+        mutable_columns = set(MUTABLE_FIELDS.values())
+        fixed = np.array([name not in mutable_columns for name in self.feature_names])
+        compatible = np.all(~fixed | ((lows < x) & (x <= highs)), axis=1)
+
+        regions = []
+        distance_j = self.feature_names.index(MUTABLE_FIELDS['distance'])
+        for leaf in np.flatnonzero(compatible):
+            region_options, lower_bound = {}, 0.0
+            for key in _BRANCH_KEYS:
+                j = self.feature_names.index(MUTABLE_FIELDS[key])
+                codes = np.array([self._code_maps.get(MUTABLE_FIELDS[key], {}).get(value, 0) for _, value, _ in options[key]])
+                allowed = (lows[leaf, j] < codes) & (codes <= highs[leaf, j])
+                region_options[key] = [option for option, ok in zip(options[key], allowed) if ok]
+                if not region_options[key]:
+                    break
+                lower_bound += min(cost for cost, _, _ in region_options[key])
+            else:
+                # La distance ne peut qu'être réduite
+                distance_low, distance_high = lows[leaf, distance_j], highs[leaf, distance_j]
+                if distance_low >= distance32:
+                    continue
+                if distance_high < distance32:
+                    lower_bound += self._distance_cost(distance, distance_high)
+                regions.append((lower_bound, region_options, distance_low, distance_high))
+        regions.sort(key=lambda region: region[0])
+        return regions
+
+    def _distance_cost(self, distance, new_distance):
+        if distance <= 0:
+            return 0.0
+        return self.change_costs['distance'] * (distance - new_distance) / distance
+
+    def _branch(self, project, options, depth, cost, chosen, partial_score, need_score,
+                distance, distance_low, distance_high, verify_model, state):
+        """Séparation-évaluation sur les variables catégorielles"""
+        best = state['best']
+        if time.perf_counter() > state['deadline']:
+            state['timed_out'] = True
+            return
+
+        if depth < len(_BRANCH_KEYS):
+            key = _BRANCH_KEYS[depth]
+            remaining = _BRANCH_KEYS[depth + 1:]
+            for option_cost, value, part in options[key]:
+                new_cost = cost + option_cost
+                if new_cost >= best['cost']:
+                    continue
+                new_chosen = dict(chosen, **{key: (value, part)})
+                if need_score and self._score_lower_bound(new_chosen, remaining, options, partial_score, distance_low) > GREEN_THRESHOLD:
+                    continue
+                self._branch(project, options, depth + 1, new_cost, new_chosen, partial_score, need_score,
+                             distance, distance_low, distance_high, verify_model, state)
+                if state['timed_out']:
+                    return
+            return
+
+        # Toutes les variables catégorielles sont fixées : plus grande distance admissible
+        score_limit = np.inf
+        if need_score:
+            slack = GREEN_THRESHOLD - partial_score - chosen['energie'][1] - chosen['materials'][1]
+            rate = chosen['transport_type'][1] * chosen['frequency'][1] * 20 / 10000
+            if slack < 0:
+                return
+            if rate > 0:
+                score_limit = slack / rate * (1 - 1e-12)
+        if verify_model:
+            # La distance vue par l'arbre (arrondie en float32) doit rester dans la feuille
+            inside = distance_low < np.float32(distance) <= distance_high
+            if distance <= score_limit and inside:
+                new_distance = distance
+            else:
+                new_distance = _float32_floor(min(distance, distance_high, score_limit))
+        else:
+            new_distance = min(distance, score_limit)
+        if np.float32(new_distance) <= distance_low or new_distance < 0:
+            return
+
+        total_cost = cost + (self._distance_cost(distance, new_distance) if new_distance < distance else 0.0)
+        if total_cost >= best['cost']:
+            return
+        candidate = dict(project, **{key: value for key, (value, _) in chosen.items()})
+        if new_distance < distance:
+            candidate['distance'] = new_distance
+        if verify_model and self._predict(candidate) != 'Vert':
+            state['rejected'] = True
+            return
+        best['cost'] = total_cost
+        best['project'] = candidate
+
+    @staticmethod
+    def _score_lower_bound(chosen, remaining, options, partial_score, distance_low):
+        """Borne inférieure du score compte tenu des choix déjà faits"""
+        def component(key):
+            if key in chosen:
+                return chosen[key][1]
+            return min(part for _, _, part in options[key])
+
+        bound = partial_score + component('energie') + component('materials')
+        bound += component('transport_type') * component('frequency') * max(distance_low, 0.0) * 20 / 10000
+        return bound
+
+    def _result(self, project, best, complete, timed_out, use_model):
+        """Mise en forme du résultat (changements, coût, nouveau score)"""
+        if best['project'] is None:
+            return {'feasible': False, 'complete': complete, 'timed_out': timed_out, 'changes': {}, 'cost': None,
+                    'factors_version': self.factors_version}
+
+        candidate = best['project']
+        carbon_score = self.scorer.calculate_carbon_score(candidate)
+        changes = {
+            key: {'from': project.get(key, self._defaults[key]), 'to': candidate[key]}
+            for key in MUTABLE_FIELDS
+            if key in candidate and candidate[key] != project.get(key, self._defaults[key])
+        }
+        result = {
+            'feasible': True,
+            # complete : recherche terminée dans le budget sans candidat écarté, la solution est optimale
+            'complete': complete,
+            'timed_out': timed_out,
+            'changes': changes,
+            'cost': float(best['cost']),
+            'project': candidate,
+            'carbon_score': carbon_score,
+            'carbon_category': self.scorer.get_carbon_category(carbon_score),
+            'factors_version': self.factors_version
+        }
+        if use_model:
+            result['ml_prediction'] = self._predict(candidate)
+        return result
@@ -0,0 +1,381 @@
+import json
+import math
+import os
+import random
+import threading
+import numpy as np
+from utils.schema import CATEGORICAL_COLUMNS, PROJECT_FIELDS, PROJECT_KEYS
+
+# Variables suivies (clés projet) : catégorielles et numériques
+CATEGORICAL_KEYS = [PROJECT_KEYS[column] for column in CATEGORICAL_COLUMNS]
+NUMERIC_KEYS = [key for key, column, _ in PROJECT_FIELDS if column not in CATEGORICAL_COLUMNS]
+
+OTHER_CATEGORY = '__autres__'
+PSI_THRESHOLDS = (0.1, 0.25)
+PSI_EPSILON = 1e-4
+MIN_LEVEL_CAPACITY = 8
+
+
+class FrequencySketch:
+    """Comptage des modalités d'une variable catégorielle (mémoire bornée par max_items)"""
+
+    def __init__(self, max_items=1000):
+        self.max_items = max_items
+        self.counts = {}
+        self.n = 0
+
+    def update(self, value):
+        counts = self.counts
+        if value in counts:
+            counts[value] += 1
+        elif len(counts) < self.max_items:
+            counts[value] = 1
+        else:
+            counts[OTHER_CATEGORY] = counts.get(OTHER_CATEGORY, 0) + 1
+        self.n += 1
+
+    def update_many(self, values):
+        for value in values:
+            self.update(value)
+
+    def merge(self, other):
+        for value, count in other.counts.items():
+            if value in self.counts or len(self.counts) < self.max_items:
+                self.counts[value] = self.counts.get(value, 0) + count
+            else:
+                self.counts[OTHER_CATEGORY] = self.counts.get(OTHER_CATEGORY, 0) + count
+        self.n += other.n
+        return self
+
+    def proportions(self, categories):
+        total = max(self.n, 1)
+        return np.array([self.counts.get(category, 0) / total for category in categories])
+
+    def to_dict(self):
+        return {'max_items': self.max_items, 'counts': dict(self.counts), 'n': self.n}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['max_items'])
+        sketch.counts = dict(data['counts'])
+        sketch.n = data['n']
+        return sketch
+
+
+class QuantileSketch:
+    """Sketch de quantiles KLL : mémoire O(k log(n/k)), fusionnable, erreur de rang ~ 1/k
+
+    Chaque niveau h contient des éléments de poids 2^h. Lorsque le sketch dépasse sa
+    capacité totale, le plus bas niveau plein est trié et réduit de moitié (un élément
+    sur deux, décalage aléatoire) vers le niveau supérieur.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.levels = [[]]
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._update_capacities()
+
+    def _update_capacities(self):
+        # Capacité décroissante vers les niveaux bas (facteur 2/3), au moins MIN_LEVEL_CAPACITY
+        depth = len(self.levels)
+        self._capacities = [
+            max(MIN_LEVEL_CAPACITY, int(math.ceil(self.k * (2 / 3) ** (depth - 1 - level))))
+            for level in range(depth)
+        ]
+        self._max_size = sum(self._capacities)
+
+    def update(self, value):
+        value = float(value)
+        self.levels[0].append(value)
+        self.n += 1
+        self._size += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.levels[0].extend(values.tolist())
+        self.n += len(values)
+        self._size += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress()
+
+    def _compress(self):
+        while self._size >= self._max_size:
+            level = next(h for h, items in enumerate(self.levels) if len(items) >= self._capacities[h])
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+                self._update_capacities()
+            items = self.levels[level]
+            items.sort()
+            # Un nombre impair d'éléments : le dernier reste au niveau courant
+            kept = [items.pop()] if len(items) % 2 else []
+            promoted = items[self._rng.randint(0, 1)::2]
+            self.levels[level + 1].extend(promoted)
+            self.levels[level] = kept
+            self._size -= len(promoted)
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._size += other._size
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._update_capacities()
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate([np.asarray(level, dtype=np.float64) for level in self.levels])
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def cdf(self, values):
+        """Fonction de répartition estimée aux points values"""
+        items, cumulative = self._weighted_items()
+        if not len(items):
+            return np.zeros(len(np.atleast_1d(values)))
+        positions = np.searchsorted(items, np.atleast_1d(values), side='right')
+        return np.where(positions > 0, cumulative[np.maximum(positions - 1, 0)], 0.0) / cumulative[-1]
+
+    def quantiles(self, probabilities):
+        """Quantiles estimés pour les probabilités données"""
+        items, cumulative = self._weighted_items()
+        if not len(items):
+            return np.full(len(np.atleast_1d(probabilities)), np.nan)
+        targets = np.atleast_1d(probabilities) * cumulative[-1]
+        return items[np.minimum(np.searchsorted(cumulative, targets, side='left'), len(items) - 1)]
+
+    def to_dict(self):
+        return {'k': self.k, 'levels': [list(level) for level in self.levels], 'n': self.n, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.levels = [list(level) for level in data['levels']]
+        sketch.n = data['n']
+        sketch._size = sum(len(level) for level in sketch.levels)
+        sketch._update_capacities()
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
+
+def population_stability_index(expected, actual, epsilon=PSI_EPSILON):
+    """PSI entre deux distributions de proportions"""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), epsilon)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_p_value(statistic, n, m):
+    """p-valeur asymptotique du test de Kolmogorov-Smirnov à deux échantillons"""
+    if n == 0 or m == 0:
+        return 1.0
+    effective = math.sqrt(n * m / (n + m))
+    lam = (effective + 0.12 + 0.11 / effective) * statistic
+    if lam < 1e-3:
+        return 1.0
+    p = 2 * sum((-1) ** (i - 1) * math.exp(-2 * i * i * lam * lam) for i in range(1, 101))
+    return float(min(max(p, 0.0), 1.0))
+
+
+def _finite_float(value):
+    """Valeur numérique finie, ou None si la saisie n'est pas exploitable (vide, texte, NaN...)"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class DriftMonitor:
+    """Suivi de la distribution des entrées (sketches par variable) et comparaison à l'entraînement
+
+    La mise à jour par projet coûte quelques opérations de dictionnaire et d'ajout en liste ;
+    les moniteurs de plusieurs processus se fusionnent avec merge (ou via to_dict / from_dict).
+    Les valeurs numériques non exploitables sont comptées (invalid) sans interrompre la mise à jour.
+    Un moniteur peut être partagé entre threads : les sketches sont protégés par un verrou.
+    """
+
+    def __init__(self, k=200, max_categories=1000):
+        self.k = k
+        self.max_categories = max_categories
+        self.categorical = {key: FrequencySketch(max_categories) for key in CATEGORICAL_KEYS}
+        self.numeric = {key: QuantileSketch(k) for key in NUMERIC_KEYS}
+        self.invalid = {key: 0 for key in NUMERIC_KEYS}
+        self._defaults = {key: default for key, _, default in PROJECT_FIELDS}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.numeric[NUMERIC_KEYS[0]].n
+
+    def update(self, project_data):
+        """Ajoute un projet (dictionnaire formulaire / API)"""
+        defaults = self._defaults
+        with self._lock:
+            for key, sketch in self.categorical.items():
+                sketch.update(project_data.get(key, defaults[key]))
+            for key, sketch in self.numeric.items():
+                value = _finite_float(project_data.get(key, defaults[key]))
+                if value is None:
+                    self.invalid[key] += 1
+                else:
+                    sketch.update(value)
+
+    def update_batch(self, projects):
+        """Ajoute un lot de projets (mise à jour vectorisée des sketches numériques)"""
+        defaults = self._defaults
+        numeric_values = {
+            key: [_finite_float(project.get(key, defaults[key])) for project in projects]
+            for key in self.numeric
+        }
+        with self._lock:
+            for key, sketch in self.categorical.items():
+                sketch.update_many(project.get(key, defaults[key]) for project in projects)
+            for key, sketch in self.numeric.items():
+                values = numeric_values[key]
+                valid = [value for value in values if value is not None]
+                self.invalid[key] += len(values) - len(valid)
+                sketch.update_many(valid)
+
+    def update_dataframe(self, df):
+        """Ajoute les lignes d'un DataFrame au format du dataset"""
+        for key, column, _ in PROJECT_FIELDS:
+            if column not in df.columns:
+                continue
+            if key in self.categorical:
+                counts = df[column].value_counts()
+                sketch = FrequencySketch.from_dict({
+                    'max_items': self.max_categories, 'counts': {value: int(count) for value, count in counts.items()}, 'n': int(counts.sum())
+                })
+                with self._lock:
+                    self.categorical[key].merge(sketch)
+            else:
+                values = df[column].dropna().to_numpy(dtype=np.float64)
+                with self._lock:
+                    self.numeric[key].update_many(values)
+        return self
+
+    def merge(self, other):
+        """Fusionne un autre moniteur (ex. d'un autre worker)"""
+        # Copie de l'autre moniteur : un seul verrou tenu à la fois
+        other = self.from_dict(other.to_dict())
+        with self._lock:
+            for key, sketch in self.categorical.items():
+                sketch.merge(other.categorical[key])
+            for key, sketch in self.numeric.items():
+                sketch.merge(other.numeric[key])
+                self.invalid[key] += other.invalid[key]
+        return self
+
+    def reset(self):
+        with self._lock:
+            self.categorical = {key: FrequencySketch(self.max_categories) for key in CATEGORICAL_KEYS}
+            self.numeric = {key: QuantileSketch(self.k) for key in NUMERIC_KEYS}
+            self.invalid = {key: 0 for key in NUMERIC_KEYS}
+
+    def to_dict(self):
+        """Copie de l'état des sketches (sérialisable en JSON)"""
+        with self._lock:
+            return {
+                'k': self.k,
+                'max_categories': self.max_categories,
+                'categorical': {key: sketch.to_dict() for key, sketch in self.categorical.items()},
+                'numeric': {key: sketch.to_dict() for key, sketch in self.numeric.items()},
+                'invalid': dict(self.invalid)
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        monitor = cls(data['k'], data['max_categories'])
+        monitor.categorical = {key: FrequencySketch.from_dict(value) for key, value in data['categorical'].items()}
+        monitor.numeric = {key: QuantileSketch.from_dict(value) for key, value in data['numeric'].items()}
+        monitor.invalid.update(data.get('invalid', {}))
+        return monitor
+
+    def save(self, filepath):
+        """Sauvegarde les sketches (JSON)"""
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filepath):
+        """Charge des sketches sauvegardés (None si le fichier n'existe pas)"""
+        try:
+            with open(filepath, encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _status(psi):
+        if psi < PSI_THRESHOLDS[0]:
+            return 'stable'
+        if psi < PSI_THRESHOLDS[1]:
+            return 'modérée'
+        return 'forte'
+
+    def report(self, reference, n_bins=10):
+        """Dérive de chaque variable par rapport au moniteur de référence (PSI, KS, modalités inconnues)"""
+        # Calcul sur des copies : les mises à jour concurrentes ne sont pas bloquées
+        current = self.from_dict(self.to_dict())
+        reference = self.from_dict(reference.to_dict())
+        report = {}
+        for key, sketch in current.categorical.items():
+            expected = reference.categorical[key]
+            categories = sorted(set(expected.counts) | set(sketch.counts), key=str)
+            psi = population_stability_index(expected.proportions(categories), sketch.proportions(categories))
+            unseen = sum(count for value, count in sketch.counts.items() if value not in expected.counts)
+            report[key] = {
+                'type': 'categorical',
+                'n': sketch.n,
+                'psi': psi,
+                'unseen_share': unseen / sketch.n if sketch.n else 0.0,
+                'status': self._status(psi) if sketch.n else 'aucune donnée'
+            }
+
+        for key, sketch in current.numeric.items():
+            expected = reference.numeric[key]
+            if not sketch.n or not expected.n:
+                report[key] = {'type': 'numeric', 'n': sketch.n, 'invalid': current.invalid[key], 'psi': 0.0, 'ks': 0.0,
+                               'ks_p_value': 1.0, 'status': 'aucune donnée'}
+                continue
+            # Classes de PSI : quantiles de la distribution de référence
+            edges = np.unique(expected.quantiles(np.linspace(0, 1, n_bins + 1)[1:-1]))
+            expected_cdf = np.concatenate([[0.0], expected.cdf(edges), [1.0]])
+            actual_cdf = np.concatenate([[0.0], sketch.cdf(edges), [1.0]])
+            psi = population_stability_index(np.diff(expected_cdf), np.diff(actual_cdf))
+
+            # KS : écart maximal entre les fonctions de répartition, évalué aux éléments des deux sketches
+            points = np.concatenate([expected._weighted_items()[0], sketch._weighted_items()[0]])
+            ks = float(np.max(np.abs(expected.cdf(points) - sketch.cdf(points))))
+            report[key] = {
+                'type': 'numeric',
+                'n': sketch.n,
+                'invalid': current.invalid[key],
+                'psi': psi,
+                'ks': ks,
+                'ks_p_value': ks_p_value(ks, expected.n, sketch.n),
+                'status': self._status(psi)
+            }
+        return report
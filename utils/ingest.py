@@ -0,0 +1,127 @@
+import json
+import os
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def row_fingerprints(df):
+    """Empreinte 64 bits stable de chaque ligne (vectorisée par colonne)
+
+    Les colonnes sont prises dans l'ordre alphabétique et les colonnes numériques converties
+    en float64 : l'empreinte ne dépend ni de l'ordre des colonnes de l'export ni du typage
+    entier / flottant des valeurs.
+    """
+    import pandas as pd
+    columns = sorted(df.columns)
+    normalized = df[columns].copy()
+    for column in columns:
+        if pd.api.types.is_numeric_dtype(normalized[column]) and not pd.api.types.is_bool_dtype(normalized[column]):
+            normalized[column] = normalized[column].astype(np.float64)
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy(dtype=np.uint64)
+
+
+class ProjectStore:
+    """Stockage colonnaire incrémental des projets, dédoublonné par empreinte de ligne
+
+    Chaque ingestion ajoute uniquement les lignes nouvelles dans une partie Parquet et leurs
+    empreintes triées dans un segment .npy. La détection des doublons lit les segments en
+    mémoire projetée (recherche dichotomique) : son coût dépend du lot reçu, pas de
+    l'historique. Les segments sont fusionnés lorsque leur nombre dépasse max_segments.
+    """
+
+    def __init__(self, store_dir='data/store', max_segments=16):
+        self.store_dir = store_dir
+        self.max_segments = max_segments
+        self.manifest = self._read_manifest()
+
+    def _path(self, *parts):
+        return os.path.join(self.store_dir, *parts)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'parts': [], 'segments': [], 'n_rows': 0, 'next_id': 0}
+
+    def _write_manifest(self):
+        # Écrit en dernier et remplacé atomiquement : une ingestion interrompue n'est pas visible
+        temporary_path = self._path(MANIFEST_FILE + '.tmp')
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temporary_path, self._path(MANIFEST_FILE))
+
+    def __len__(self):
+        return self.manifest['n_rows']
+
+    def _known(self, fingerprints):
+        """Masque des empreintes déjà présentes dans le stockage"""
+        known = np.zeros(len(fingerprints), dtype=bool)
+        for segment in self.manifest['segments']:
+            stored = np.load(self._path(segment), mmap_mode='r')
+            if not len(stored):
+                continue
+            positions = np.minimum(np.searchsorted(stored, fingerprints), len(stored) - 1)
+            known |= stored[positions] == fingerprints
+        return known
+
+    def ingest(self, df):
+        """Ajoute les lignes nouvelles d'un lot ; retourne les statistiques de l'ingestion"""
+        fingerprints = row_fingerprints(df)
+        # Doublons internes au lot : première occurrence conservée
+        _, first = np.unique(fingerprints, return_index=True)
+        unique_in_batch = np.zeros(len(df), dtype=bool)
+        unique_in_batch[first] = True
+        new = unique_in_batch & ~self._known(fingerprints)
+
+        stats = {
+            'received': len(df),
+            'duplicates_in_batch': int(len(df) - unique_in_batch.sum()),
+            'already_stored': int((unique_in_batch & ~new).sum()),
+            'appended': int(new.sum()),
+            'part': None
+        }
+        if not stats['appended']:
+            return stats
+
+        os.makedirs(self._path('parts'), exist_ok=True)
+        os.makedirs(self._path('fingerprints'), exist_ok=True)
+        part_id = self.manifest['next_id']
+        part = os.path.join('parts', f'part-{part_id:05d}.parquet')
+        segment = os.path.join('fingerprints', f'segment-{part_id:05d}.npy')
+        df[new].reset_index(drop=True).to_parquet(self._path(part), index=False)
+        np.save(self._path(segment), np.sort(fingerprints[new]))
+
+        self.manifest['parts'].append({'file': part, 'n_rows': stats['appended']})
+        self.manifest['segments'].append(segment)
+        self.manifest['n_rows'] += stats['appended']
+        self.manifest['next_id'] = part_id + 1
+        self._write_manifest()
+        stats['part'] = part
+
+        if len(self.manifest['segments']) > self.max_segments:
+            self.compact_fingerprints()
+        return stats
+
+    def compact_fingerprints(self):
+        """Fusionne les segments d'empreintes en un seul tableau trié"""
+        segments = self.manifest['segments']
+        if len(segments) <= 1:
+            return
+        merged = np.sort(np.concatenate([np.load(self._path(segment)) for segment in segments]))
+        segment = os.path.join('fingerprints', f"segment-{self.manifest['next_id']:05d}-merged.npy")
+        np.save(self._path(segment), merged)
+        self.manifest['segments'] = [segment]
+        self.manifest['next_id'] += 1
+        self._write_manifest()
+        for old_segment in segments:
+            os.remove(self._path(old_segment))
+
+    def load(self, columns=None):
+        """Charge toutes les lignes stockées (ordre d'ingestion)"""
+        import pandas as pd
+        frames = [pd.read_parquet(self._path(part['file']), columns=columns) for part in self.manifest['parts']]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
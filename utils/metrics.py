@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Histogram:
+    """Compteur, somme et fenêtre glissante des dernières observations (pour les quantiles)"""
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """Registre de métriques (compteurs et histogrammes) exportable en Prometheus ou JSON"""
+
+    def __init__(self, prefix='carbon_', max_samples=4096):
+        self.prefix = prefix
+        self.max_samples = max_samples
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Incrémente un compteur"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Ajoute une observation à un histogramme"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.max_samples)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Chronomètre un bloc et enregistre sa durée (secondes) dans un histogramme"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name, **labels):
+        """Retourne la valeur d'un compteur"""
+        return self._counters.get(self._key(name, labels), 0)
+
+    def quantiles(self, name, **labels):
+        """Retourne les quantiles p50/p95/p99 d'un histogramme"""
+        histogram = self._histograms.get(self._key(name, labels))
+        if histogram is None:
+            return None
+        with self._lock:
+            return histogram.quantiles()
+
+    def reset(self):
+        """Remet toutes les métriques à zéro"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+    def snapshot(self):
+        """Retourne un instantané des métriques sous forme de dictionnaire"""
+        with self._lock:
+            counters = {
+                name + self._format_labels(labels): value
+                for (name, labels), value in sorted(self._counters.items())
+            }
+            histograms = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                quantiles = histogram.quantiles()
+                histograms[name + self._format_labels(labels)] = {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'p50': quantiles[0.5],
+                    'p95': quantiles[0.95],
+                    'p99': quantiles[0.99]
+                }
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self, indent=2):
+        """Exporte l'instantané des métriques en JSON"""
+        return json.dumps(self.snapshot(), indent=indent, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Exporte les métriques au format texte Prometheus"""
+        lines = []
+        with self._lock:
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                metric = f'{self.prefix}{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f'{metric}{self._format_labels(labels)} {value}')
+
+            histogram_names = sorted({name for name, _ in self._histograms})
+            for name in histogram_names:
+                metric = f'{self.prefix}{name}'
+                lines.append(f'# TYPE {metric} summary')
+                for (histogram_name, labels), histogram in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for q, value in histogram.quantiles().items():
+                        lines.append(f'{metric}{self._format_labels(labels, [("quantile", q)])} {value:.9g}')
+                    lines.append(f'{metric}_sum{self._format_labels(labels)} {histogram.sum:.9g}')
+                    lines.append(f'{metric}_count{self._format_labels(labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,163 @@
+from utils.schema import CATEGORICAL_COLUMNS, PROJECT_FIELDS, PROJECT_KEYS
+from utils.scoring_utils import CATEGORIES, CarbonScorer
+
+BUDGET_COLUMN = 'Budget carbone estimé (tCO2e)'
+NAME_COLUMN = 'Nom du projet'
+
+# Dimensions d'agrégation : variables catégorielles du projet et catégorie carbone calculée
+DIMENSIONS = [PROJECT_KEYS[column] for column in CATEGORICAL_COLUMNS] + ['carbon_category']
+
+DEFAULT_GROUPINGS = [
+    ('sector',),
+    ('energie',),
+    ('carbon_category',),
+    ('sector', 'energie'),
+    ('sector', 'carbon_category')
+]
+
+# Position des compteurs dans un agrégat : [effectif, somme, somme des carrés, tCO2e, catégories...]
+_COUNT, _SUM, _SUM_SQ, _TCO2E = range(4)
+_CATEGORY_SLOTS = {category: 4 + i for i, category in enumerate(CATEGORIES)}
+
+
+class PortfolioRollups:
+    """Agrégats du portefeuille maintenus incrémentalement
+
+    Pour chaque regroupement (combinaison de dimensions catégorielles) et chaque valeur de
+    clé, on conserve l'effectif, la somme et la somme des carrés des scores carbone, le total
+    tCO2e et l'histogramme des catégories. Ajouter, retirer ou re-scorer un projet met à
+    jour chaque regroupement en temps constant ; le total du portefeuille est le
+    regroupement vide ().
+    """
+
+    def __init__(self, groupings=None, scorer=None):
+        self.scorer = scorer or CarbonScorer()
+        self.groupings = [()] + [tuple(grouping) for grouping in (DEFAULT_GROUPINGS if groupings is None else groupings)]
+        for grouping in self.groupings:
+            unknown = [dimension for dimension in grouping if dimension not in DIMENSIONS]
+            if unknown:
+                raise ValueError(f"Dimensions inconnues : {', '.join(unknown)} (disponibles : {', '.join(DIMENSIONS)})")
+        self._rollups = {grouping: {} for grouping in self.groupings}
+        # Projet -> (valeurs des dimensions, score, tCO2e) pour les retraits et mises à jour
+        self._projects = {}
+        self._defaults = {key: default for key, _, default in PROJECT_FIELDS}
+
+    def __len__(self):
+        return len(self._projects)
+
+    def __contains__(self, project_id):
+        return project_id in self._projects
+
+    def _apply(self, dimensions, score, tco2e, sign):
+        category_slot = _CATEGORY_SLOTS[dimensions['carbon_category']]
+        for grouping, rollup in self._rollups.items():
+            key = tuple(dimensions[dimension] for dimension in grouping)
+            aggregate = rollup.get(key)
+            if aggregate is None:
+                aggregate = rollup[key] = [0, 0.0, 0.0, 0.0] + [0] * len(CATEGORIES)
+            aggregate[_COUNT] += sign
+            aggregate[_SUM] += sign * score
+            aggregate[_SUM_SQ] += sign * score * score
+            aggregate[_TCO2E] += sign * tco2e
+            aggregate[category_slot] += sign
+            if aggregate[_COUNT] == 0:
+                del rollup[key]
+
+    def add(self, project_id, project_data, carbon_score=None, tco2e=None):
+        """Ajoute un projet (score calculé par CarbonScorer si non fourni)"""
+        if project_id in self._projects:
+            raise ValueError(f"Projet déjà présent dans le portefeuille : {project_id}")
+        if carbon_score is None:
+            carbon_score = self.scorer.calculate_carbon_score(project_data)
+        if tco2e is None:
+            tco2e = project_data.get('carbon_budget', 0.0)
+
+        dimensions = {key: project_data.get(key, self._defaults.get(key)) for key in DIMENSIONS[:-1]}
+        dimensions['carbon_category'] = self.scorer.get_carbon_category(carbon_score)
+        entry = (dimensions, float(carbon_score), float(tco2e))
+        self._projects[project_id] = entry
+        self._apply(*entry, sign=1)
+
+    def remove(self, project_id):
+        """Retire un projet du portefeuille"""
+        entry = self._projects.pop(project_id, None)
+        if entry is None:
+            raise KeyError(project_id)
+        self._apply(*entry, sign=-1)
+
+    def update(self, project_id, project_data, carbon_score=None, tco2e=None):
+        """Remplace un projet (nouvelles données ou nouveau score)"""
+        self.remove(project_id)
+        self.add(project_id, project_data, carbon_score=carbon_score, tco2e=tco2e)
+
+    def add_many(self, projects, project_ids=None):
+        """Ajoute un lot de projets (scores calculés de façon vectorisée)"""
+        scores = self.scorer.calculate_carbon_scores(projects)
+        if project_ids is None:
+            project_ids = [project.get('name', len(self._projects) + i) for i, project in enumerate(projects)]
+        for project_id, project, score in zip(project_ids, projects, scores):
+            self.add(project_id, project, carbon_score=score)
+
+    @classmethod
+    def from_dataframe(cls, df, groupings=None, scorer=None):
+        """Construit les agrégats à partir d'un DataFrame au format du dataset
+
+        Un projet présent plusieurs fois (ex. relivré corrigé dans un ProjectStore) est
+        compté une seule fois, avec sa dernière version.
+        """
+        portfolio = cls(groupings=groupings, scorer=scorer)
+        scores = portfolio.scorer.calculate_carbon_scores(df)
+        budgets = df[BUDGET_COLUMN].to_numpy() if BUDGET_COLUMN in df.columns else [0.0] * len(df)
+        project_ids = df[NAME_COLUMN].tolist() if NAME_COLUMN in df.columns else df.index.tolist()
+
+        columns = {column: key for column, key in PROJECT_KEYS.items() if column in df.columns}
+        records = df[list(columns)].rename(columns=columns).to_dict('records')
+        for project_id, record, score, budget in zip(project_ids, records, scores, budgets):
+            if project_id in portfolio:
+                portfolio.update(project_id, record, carbon_score=score, tco2e=budget)
+            else:
+                portfolio.add(project_id, record, carbon_score=score, tco2e=budget)
+        return portfolio
+
+    @staticmethod
+    def _summary(aggregate):
+        count = aggregate[_COUNT]
+        mean = aggregate[_SUM] / count
+        return {
+            'count': count,
+            'score_sum': aggregate[_SUM],
+            'score_mean': mean,
+            'score_std': max(aggregate[_SUM_SQ] / count - mean * mean, 0.0) ** 0.5,
+            'tco2e': aggregate[_TCO2E],
+            'categories': {category: aggregate[slot] for category, slot in _CATEGORY_SLOTS.items()}
+        }
+
+    def rollup(self, grouping):
+        """Agrégats d'un regroupement : {clé (tuple de valeurs): résumé}"""
+        grouping = tuple(grouping)
+        if grouping not in self._rollups:
+            raise ValueError(f"Regroupement non matérialisé : {grouping}")
+        return {key: self._summary(aggregate) for key, aggregate in self._rollups[grouping].items()}
+
+    def totals(self):
+        """Résumé du portefeuille complet"""
+        aggregate = self._rollups[()].get(())
+        if aggregate is None:
+            return {
+                'count': 0, 'score_sum': 0.0, 'score_mean': 0.0, 'score_std': 0.0, 'tco2e': 0.0,
+                'categories': {category: 0 for category in CATEGORIES}
+            }
+        return self._summary(aggregate)
+
+    def to_frame(self, grouping):
+        """Agrégats d'un regroupement sous forme de DataFrame (une ligne par clé)"""
+        import pandas as pd
+
+        rows = []
+        for key, summary in self.rollup(grouping).items():
+            row = dict(zip(grouping, key))
+            row.update({name: value for name, value in summary.items() if name != 'categories'})
+            row.update(summary['categories'])
+            rows.append(row)
+        columns = list(grouping) + ['count', 'score_sum', 'score_mean', 'score_std', 'tco2e'] + CATEGORIES
+        return pd.DataFrame(rows, columns=columns)
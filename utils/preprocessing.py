@@ -1,22 +1,41 @@
-import pandas as pd
+import os
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split
+from utils.schema import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+
+# pandas et sklearn sont importés à la première utilisation (démarrage plus rapide)
 
 class DataPreprocessor:
-    def __init__(self):
+    def __init__(self, metrics=None):
+        self.metrics = metrics
         self.label_encoders = {}
-        self.scaler = StandardScaler()
-        self.categorical_columns = ['Secteur', 'Énergie utilisée', 'Type de transport', 'Fréquence transport', 'Matériaux']
+        # Tables valeur -> code dérivées des encodeurs : {colonne: (classes_, table)}
+        self._code_maps = {}
+        self._scaler = None
+        self.categorical_columns = list(CATEGORICAL_COLUMNS)
+    
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            from sklearn.preprocessing import StandardScaler
+            self._scaler = StandardScaler()
+        return self._scaler
         
     def load_data(self, filepath):
-        """Charge les données depuis un fichier CSV"""
-        return pd.read_csv(filepath)
+        """Charge les données depuis un fichier CSV ou un stockage incrémental (répertoire ProjectStore)"""
+        import pandas as pd
+        if os.path.isdir(filepath):
+            from utils.ingest import ProjectStore
+            return ProjectStore(filepath).load()
+        df = pd.read_csv(filepath)
+        # Harmonise l'apostrophe typographique des en-têtes (ex: "Taille de l’équipe / locaux")
+        df.columns = df.columns.str.replace('’', "'")
+        return df
     
-    def clean_data(self, df):
-        """Nettoie les données"""
+    def clean_data(self, df, drop_duplicates=True):
+        """Nettoie les données (drop_duplicates=False pour des données déjà dédoublonnées à l'ingestion)"""
         # Supprime les doublons
-        df = df.drop_duplicates()
+        if drop_duplicates:
+            df = df.drop_duplicates()
         
       # Gère les valeurs manquantes
         for col in df.columns:
@@ -30,6 +49,8 @@ class DataPreprocessor:
     def encode_categorical_variables(self, df, fit=True):
         """Encode les variables catégorielles"""
         df_encoded = df.copy()
+        if fit:
+            from sklearn.preprocessing import LabelEncoder
         
         for col in self.categorical_columns:
             if col in df_encoded.columns:
@@ -38,14 +59,68 @@ class DataPreprocessor:
                     df_encoded[col] = self.label_encoders[col].fit_transform(df_encoded[col])
                 else:
                     if col in self.label_encoders:
-                        try:
-                            df_encoded[col] = self.label_encoders[col].transform(df_encoded[col])
-                        except ValueError:
-                            # Gère les nouvelles catégories non vues pendant l'entraînement
-                            df_encoded[col] = 0
+                        codes = df_encoded[col].map(self._code_map(col))
+                        # Gère les nouvelles catégories non vues pendant l'entraînement (code 0)
+                        unseen = codes.isna()
+                        if unseen.any():
+                            if self.metrics is not None:
+                                self.metrics.inc('unseen_categories', int(unseen.sum()), column=col)
+                            codes = codes.fillna(0)
+                        df_encoded[col] = codes.astype(int)
         
         return df_encoded
     
+    def _code_map(self, col):
+        """Table valeur -> code d'une variable catégorielle (reconstruite si l'encodeur change)"""
+        classes = self.label_encoders[col].classes_
+        cached = self._code_maps.get(col)
+        if cached is None or cached[0] is not classes:
+            cached = (classes, {value: code for code, value in enumerate(classes)})
+            self._code_maps[col] = cached
+        return cached[1]
+    
+    def encode_record(self, record):
+        """Encode un seul projet (dictionnaire au format du dataset) sans passer par un DataFrame"""
+        features = []
+        for col in FEATURE_COLUMNS:
+            value = record[col]
+            if col in self.categorical_columns and col in self.label_encoders:
+                code = self._code_map(col).get(value)
+                if code is None:
+                    # Nouvelle catégorie non vue pendant l'entraînement (code 0)
+                    if self.metrics is not None:
+                        self.metrics.inc('unseen_categories', 1, column=col)
+                    code = 0
+                value = code
+            features.append(value)
+        return np.array([features], dtype=np.float64)
+    
+    def extend_encoders(self, df):
+        """Ajoute les nouvelles modalités en fin de vocabulaire (les codes existants ne changent pas)"""
+        added = {}
+        for col in self.categorical_columns:
+            if col not in df.columns or col not in self.label_encoders:
+                continue
+            encoder = self.label_encoders[col]
+            known = set(encoder.classes_)
+            new_values = sorted(set(df[col].dropna()) - known)
+            if new_values:
+                encoder.classes_ = np.concatenate([encoder.classes_, np.array(new_values, dtype=object)])
+                added[col] = new_values
+        return added
+    
+    def get_vocabularies(self):
+        """Retourne les modalités connues de chaque variable catégorielle (ordre des codes)"""
+        return {col: [str(value) for value in encoder.classes_] for col, encoder in self.label_encoders.items()}
+    
+    def set_vocabularies(self, vocabularies):
+        """Restaure les encodeurs à partir des modalités sauvegardées"""
+        from sklearn.preprocessing import LabelEncoder
+        for col, values in vocabularies.items():
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(values, dtype=object)
+            self.label_encoders[col] = encoder
+    
     def create_carbon_category(self, df):
         """Crée une catégorie basée sur le budget carbone"""
         conditions = [
@@ -59,16 +134,11 @@ class DataPreprocessor:
     
     def prepare_features(self, df):
         """Prépare les features pour le modèle"""
-        feature_columns = [
-            'Secteur', 'Énergie utilisée', 'Type de transport', 
-            'Distance transport (km)', 'Fréquence transport', 'Matériaux',
-            'Taille de l\'équipe / locaux', 'Durée de vie estimée (ans)', 'Score ESG initial'
-        ]
-        
-        return df[feature_columns]
+        return df[FEATURE_COLUMNS]
     
     def split_data(self, X, y, test_size=0.2, random_state=42):
         """Divise les données en ensembles d'entraînement et de test"""
+        from sklearn.model_selection import train_test_split
         return train_test_split(X, y, test_size=test_size, random_state=random_state)
     
     def preprocess_pipeline(self, filepath):
@@ -76,8 +146,8 @@ class DataPreprocessor:
         # Charge les données
         df = self.load_data(filepath)
         
-        # Nettoie les données
-        df = self.clean_data(df)
+        # Nettoie les données (le stockage incrémental est déjà dédoublonné)
+        df = self.clean_data(df, drop_duplicates=not os.path.isdir(filepath))
         
         # Crée la catégorie carbone
         df = self.create_carbon_category(df)
@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class _StackSampler(threading.Thread):
+    """Échantillonne périodiquement la pile d'un thread cible"""
+
+    def __init__(self, thread_id, interval_s):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class SlowRequestProfiler:
+    """Profileur par échantillonnage qui conserve les requêtes plus lentes qu'un seuil
+
+    Les profils sont écrits au format "collapsed stacks" (une pile par ligne suivie du
+    nombre d'échantillons), lisible par flamegraph.pl ou speedscope.
+    Seuls les chemins des max_recent derniers profils sont gardés en mémoire.
+    """
+
+    def __init__(self, threshold_s=0.5, output_dir='profiles', interval_s=0.005, max_recent=100):
+        self.threshold_s = threshold_s
+        self.output_dir = output_dir
+        self.interval_s = interval_s
+        self.dumped_profiles = deque(maxlen=max_recent)
+
+    @contextmanager
+    def profile(self, name):
+        """Profile le bloc et écrit le profil si sa durée dépasse le seuil"""
+        sampler = _StackSampler(threading.get_ident(), self.interval_s)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            if elapsed >= self.threshold_s and sampler.stacks:
+                self.dumped_profiles.append(self._dump(name, sampler.stacks, elapsed))
+
+    def _dump(self, name, stacks, elapsed):
+        """Écrit les piles échantillonnées dans un fichier .folded"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        filepath = os.path.join(self.output_dir, f"{name}_{timestamp}_{elapsed * 1000:.0f}ms.folded")
+        with open(filepath, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return filepath
@@ -0,0 +1,82 @@
+import json
+import os
+
+
+class _RowGroupSink:
+    """Écriture de lignes par groupes de taille fixe (mémoire bornée par row_group_size)"""
+
+    def __init__(self, filepath, row_group_size=1000):
+        if row_group_size < 1:
+            raise ValueError("row_group_size doit être strictement positif")
+        self.filepath = filepath
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._rows = []
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._write_rows(self._rows)
+            self.rows_written += len(self._rows)
+            self._rows = []
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class JsonlSink(_RowGroupSink):
+    """Une ligne JSON par résultat"""
+
+    def __init__(self, filepath, row_group_size=1000):
+        super().__init__(filepath, row_group_size)
+        self._file = open(filepath, 'w', encoding='utf-8')
+
+    def _write_rows(self, rows):
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetSink(_RowGroupSink):
+    """Fichier Parquet écrit groupe de lignes par groupe de lignes (nécessite pyarrow)"""
+
+    def __init__(self, filepath, row_group_size=1000):
+        super().__init__(filepath, row_group_size)
+        self._writer = None
+
+    def _write_rows(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(rows, schema=self._writer.schema if self._writer else None)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.filepath, table.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_sink(filepath, row_group_size=1000):
+    """Ouvre un puits de résultats selon l'extension (.parquet ou .jsonl)"""
+    if filepath.endswith('.parquet'):
+        return ParquetSink(filepath, row_group_size)
+    if filepath.endswith('.jsonl'):
+        return JsonlSink(filepath, row_group_size)
+    raise ValueError(f"Format de sortie non supporté : {filepath} (attendu : .parquet ou .jsonl)")
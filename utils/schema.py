@@ -0,0 +1,24 @@
+# Correspondance entre les clés d'un projet (formulaire / API), les colonnes du dataset
+# et les valeurs par défaut utilisées lorsque la clé est absente
+PROJECT_FIELDS = [
+    ('sector', 'Secteur', 'Production industrielle'),
+    ('energie', 'Énergie utilisée', 'mix'),
+    ('transport_type', 'Type de transport', 'routier'),
+    ('distance', 'Distance transport (km)', 1000),
+    ('frequency', 'Fréquence transport', 'mensuelle'),
+    ('materials', 'Matériaux', 'plastique'),
+    ('team_size', 'Taille de l\'équipe / locaux', 50),
+    ('duration', 'Durée de vie estimée (ans)', 20),
+    ('esg_initial', 'Score ESG initial', 50)
+]
+
+FEATURE_COLUMNS = [column for _, column, _ in PROJECT_FIELDS]
+
+CATEGORICAL_COLUMNS = ['Secteur', 'Énergie utilisée', 'Type de transport', 'Fréquence transport', 'Matériaux']
+
+PROJECT_KEYS = {column: key for key, column, _ in PROJECT_FIELDS}
+
+
+def project_to_record(project_data):
+    """Convertit un dictionnaire projet en ligne au format du dataset"""
+    return {column: project_data.get(key, default) for key, column, default in PROJECT_FIELDS}
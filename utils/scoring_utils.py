@@ -1,77 +1,287 @@
+import copy
+import json
+import os
 import numpy as np
-import pandas as pd
+from itertools import islice
+from utils.schema import PROJECT_FIELDS
 
-class CarbonScorer:
-    def __init__(self):
-        # Facteurs d'émission (inspirés de la Base Carbone ADEME)
-        self.energy_factors = {
-            'renouvelable': 0.1,
-            'mix': 0.5,
-            'fossile': 1.0
-        }
-        
-        self.transport_factors = {
-            'ferroviaire': 0.2,
-            'routier': 0.8,
-            'maritime': 0.6,
-            'aérien': 1.2
-        }
-        
-        self.material_factors = {
-            'bois': 0.2,
-            'recyclé': 0.3,
-            'verre': 0.5,
-            'plastique': 0.7,
-            'acier': 0.9,
-            'béton': 1.0
-        }
-        
-        self.sector_factors = {
-            'Agriculture durable': 0.3,
-            'Projets numériques': 0.4,
-            'Construction immobilière': 0.8,
-            'Transport / logistique': 0.9,
-            'Production industrielle': 1.0
+CATEGORIES = ['Vert', 'Acceptable', 'Très polluant']
+
+DEFAULT_FACTORS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'emission_factors.json')
+
+# Tables de facteurs d'émission présentes dans le fichier versionné
+FACTOR_TABLES = ['energy', 'transport', 'frequency', 'material', 'sector']
+
+
+class EmissionFactors:
+    """Jeu versionné de facteurs d'émission, compilé en tableaux denses (non modifié après construction)"""
+
+    def __init__(self, data):
+        missing = [name for name in FACTOR_TABLES + ['version', 'defaults'] if name not in data]
+        if missing:
+            raise ValueError(f"Fichier de facteurs incomplet, clés manquantes : {', '.join(missing)}")
+        self.version = str(data['version'])
+        self.factors = {name: dict(data[name]) for name in FACTOR_TABLES}
+        self.defaults = dict(data['defaults'])
+        self.social = dict(data.get('social', {}))
+        self.governance = data.get('governance', 70)
+        self.uncertainty = dict(data.get('uncertainty', {}))
+        self.labels = data.get('labels', {})
+        # Table -> (modalité -> indice, facteurs) ; dernière case : valeur par défaut des modalités inconnues
+        self.tables = {
+            name: (
+                {key: i for i, key in enumerate(factors)},
+                np.array(list(factors.values()) + [self.defaults[name]], dtype=np.float64)
+            )
+            for name, factors in self.factors.items()
         }
+
+    def factor(self, table, value):
+        """Facteur d'une modalité (valeur par défaut si la modalité est inconnue)"""
+        return self.factors[table].get(value, self.defaults[table])
+
+    @classmethod
+    def load(cls, filepath=DEFAULT_FACTORS_PATH):
+        with open(filepath, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+
+def save_emission_factors(data, filepath=DEFAULT_FACTORS_PATH):
+    """Écrit un fichier de facteurs de façon atomique (fichier temporaire puis renommage)"""
+    EmissionFactors(data)
+    temporary_path = f"{filepath}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, filepath)
+
+
+class CarbonScorer:
+    def __init__(self, factors_path=DEFAULT_FACTORS_PATH):
+        # Facteurs d'émission versionnés (inspirés de la Base Carbone ADEME), voir data/emission_factors.json
+        self.factors_path = factors_path
+        self._factors_mtime = None
+        self.load_factors()
+    
+    def load_factors(self, factors_path=None):
+        """Charge et compile un fichier de facteurs puis l'active (remplacement atomique de la référence)
         
-        self.frequency_factors = {
-            'ponctuelle': 0.2,
-            'mensuelle': 0.5,
-            'hebdomadaire': 0.8,
-            'quotidienne': 1.0
-        }
+        Les calculs en cours conservent le jeu qu'ils ont lu ; aucun verrou sur le chemin de scoring.
+        """
+        factors_path = factors_path or self.factors_path
+        mtime = os.stat(factors_path).st_mtime_ns
+        factors = EmissionFactors.load(factors_path)
+        self.factors_path = factors_path
+        self._factors_mtime = mtime
+        self._factors = factors
+        return factors.version
+    
+    def reload_if_changed(self):
+        """Recharge les facteurs si le fichier a été modifié (à appeler périodiquement par un service)"""
+        try:
+            mtime = os.stat(self.factors_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._factors_mtime:
+            return False
+        self.load_factors()
+        return True
+    
+    def snapshot(self):
+        """Scorer figé sur le jeu de facteurs courant (cohérence sur plusieurs calculs)"""
+        return copy.copy(self)
+    
+    @property
+    def factors(self):
+        return self._factors
+    
+    @property
+    def factors_version(self):
+        return self._factors.version
+    
+    @property
+    def energy_factors(self):
+        return self._factors.factors['energy']
+    
+    @property
+    def transport_factors(self):
+        return self._factors.factors['transport']
+    
+    @property
+    def material_factors(self):
+        return self._factors.factors['material']
+    
+    @property
+    def sector_factors(self):
+        return self._factors.factors['sector']
+    
+    @property
+    def frequency_factors(self):
+        return self._factors.factors['frequency']
+    
+    @property
+    def social_factors(self):
+        return self._factors.social
+    
+    @property
+    def governance_score(self):
+        return self._factors.governance
+    
+    @property
+    def factor_uncertainty(self):
+        return self._factors.uncertainty
     
     def calculate_carbon_score(self, project_data):
         """Calcule le score carbone d'un projet (0-100)"""
-        score = 0
-        
-        # Facteur énergie (poids: 25%)
-        energy_score = self.energy_factors.get(project_data.get('energie', 'mix'), 0.5) * 25
+        return self.score_from_impact_factors(self.get_impact_factors(project_data))
+    
+    @staticmethod
+    def score_from_impact_factors(impact_factors):
+        """Score carbone (0-100) à partir des composantes de get_impact_factors"""
+        return min(100, max(0, sum(impact_factors.values())))
+    
+    def _factor_tables(self):
+        """Facteurs sous forme de tableaux (dernière case : valeur par défaut des modalités inconnues)"""
+        return self._factors.tables
+    
+    @staticmethod
+    def _batch_values(projects):
+        """Valeurs de chaque clé projet pour un lot (liste de dictionnaires ou DataFrame du dataset)"""
+        if hasattr(projects, 'columns'):
+            return {
+                key: projects[column].to_numpy() if column in projects.columns else np.full(len(projects), default, dtype=object)
+                for key, column, default in PROJECT_FIELDS
+            }
+        return {key: [project.get(key, default) for project in projects] for key, _, default in PROJECT_FIELDS}
+    
+    def encode_batch(self, projects, tables=None):
+        """Encode un lot de projets en indices de facteurs et variables numériques"""
+        tables = tables or self._factor_tables()
+        values = self._batch_values(projects)
         
-        # Facteur transport (poids: 20%)
-        transport_type_score = self.transport_factors.get(project_data.get('transport_type', 'routier'), 0.8)
-        distance = project_data.get('distance', 1000) / 10000  # Normalise par 10000 km
-        frequency_score = self.frequency_factors.get(project_data.get('frequency', 'mensuelle'), 0.5)
-        transport_score = (transport_type_score * distance * frequency_score) * 20
+        def lookup(name, column_values):
+            index, factors = tables[name]
+            unknown = len(factors) - 1
+            return np.array([index.get(value, unknown) for value in column_values], dtype=np.int64)
         
-        # Facteur matériaux (poids: 15%)
-        materials = project_data.get('materials', 'plastique').split(', ')
-        material_score = np.mean([self.material_factors.get(mat.strip(), 0.5) for mat in materials]) * 15
+        # Matériaux : poids 1/n sur chaque matériau listé (moyenne des facteurs), une fois par chaîne distincte
+        material_index, material_factors = tables['material']
+        unique_materials, inverse = np.unique(np.asarray(values['materials'], dtype=str), return_inverse=True)
+        weights = np.zeros((len(unique_materials), len(material_factors)))
+        for row, materials in enumerate(unique_materials):
+            parts = [m.strip() for m in materials.split(', ')]
+            for material in parts:
+                weights[row, material_index.get(material, len(material_factors) - 1)] += 1 / len(parts)
         
-        # Facteur secteur (poids: 20%)
-        sector_score = self.sector_factors.get(project_data.get('sector', 'Production industrielle'), 1.0) * 20
+        return {
+            'energy': lookup('energy', values['energie']),
+            'transport': lookup('transport', values['transport_type']),
+            'frequency': lookup('frequency', values['frequency']),
+            'sector': lookup('sector', values['sector']),
+            'material_weights': weights[inverse],
+            'distance': np.asarray(values['distance'], dtype=np.float64),
+            'team_size': np.asarray(values['team_size'], dtype=np.float64),
+            'duration': np.asarray(values['duration'], dtype=np.float64)
+        }
+    
+    def _batch_scores(self, encoded, draws):
+        """Scores (n_projets, n_tirages) pour des tirages de facteurs {table: (n_tirages, n_modalités)}"""
+        energy_score = draws['energy'][:, encoded['energy']].T * 25
+        transport_score = (
+            draws['transport'][:, encoded['transport']].T
+            * (encoded['distance'] / 10000)[:, None]
+            * draws['frequency'][:, encoded['frequency']].T
+        ) * 20
+        material_score = (encoded['material_weights'] @ draws['material'].T) * 15
+        sector_score = draws['sector'][:, encoded['sector']].T * 20
         
-        # Facteur taille équipe (poids: 10%)
-        team_size = project_data.get('team_size', 50) / 500  # Normalise par 500
-        team_score = min(team_size, 1.0) * 10
+        # Composantes sans facteur d'émission (non aléatoires)
+        team_score = np.minimum(encoded['team_size'] / 500, 1.0) * 10
+        duration_score = np.maximum(0, 1 - encoded['duration'] / 50) * 10
         
-        # Facteur durée de vie (poids: 10%)
-        duration = project_data.get('duration', 20)
-        duration_score = max(0, (1 - duration / 50)) * 10  # Plus c'est long, moins c'est polluant
+        score = energy_score + transport_score + material_score + sector_score + (team_score + duration_score)[:, None]
+        return np.clip(score, 0, 100)
+    
+    def calculate_carbon_scores(self, projects):
+        """Calcule le score carbone d'un lot de projets (vectorisé)"""
+        tables = self._factor_tables()
+        draws = {name: factors[None, :] for name, (_, factors) in tables.items()}
+        return self._batch_scores(self.encode_batch(projects, tables), draws)[:, 0]
+    
+    def calculate_esg_scores(self, projects, carbon_scores=None):
+        """Calcule le score ESG d'un lot de projets (vectorisé)"""
+        scorer = self.snapshot()
+        factors = scorer.factors
+        if carbon_scores is None:
+            carbon_scores = scorer.calculate_carbon_scores(projects)
+        sectors = self._batch_values(projects)['sector']
+        default_social = factors.defaults.get('social', 50)
+        social_scores = np.array([factors.social.get(sector, default_social) for sector in sectors], dtype=np.float64)
+        esg_scores = (100 - np.asarray(carbon_scores)) * 0.4 + social_scores * 0.3 + factors.governance * 0.3
+        return np.clip(esg_scores, 0, 100)
+    
+    def draw_factor_samples(self, n_samples=1000, seed=42):
+        """Tire n_samples jeux de facteurs d'émission selon leur incertitude"""
+        rng = np.random.default_rng(seed)
+        draws = {}
+        emission_factors = self._factors
+        for name, (_, factors) in emission_factors.tables.items():
+            sigma = emission_factors.uncertainty.get(name, 0.0)
+            draws[name] = factors[None, :] * rng.lognormal(0.0, sigma, size=(n_samples, len(factors)))
+        return draws
+    
+    def iter_carbon_score_uncertainty(self, projects, n_samples=1000, seed=42, chunk_size=1000,
+                                      percentiles=(5, 50, 95)):
+        """Calcule les percentiles du score et la probabilité de chaque catégorie, par lots
         
-        score = energy_score + transport_score + material_score + sector_score + team_score + duration_score
+        Les mêmes tirages de facteurs sont utilisés pour tous les projets (incertitude
+        systématique des facteurs) ; la mémoire est bornée par chunk_size x n_samples.
+        """
+        scorer = self.snapshot()
+        tables = scorer._factor_tables()
+        draws = scorer.draw_factor_samples(n_samples=n_samples, seed=seed)
         
-        return min(100, max(0, score))
+        for chunk in self._iter_chunks(projects, chunk_size):
+            scores = scorer._batch_scores(scorer.encode_batch(chunk, tables), draws)
+            result = {f'p{p}': values for p, values in zip(percentiles, np.percentile(scores, percentiles, axis=1))}
+            result['mean'] = scores.mean(axis=1)
+            result['category_probabilities'] = {
+                'Vert': (scores <= 30).mean(axis=1),
+                'Acceptable': ((scores > 30) & (scores <= 60)).mean(axis=1),
+                'Très polluant': (scores > 60).mean(axis=1)
+            }
+            result['factors_version'] = scorer.factors_version
+            yield result
+    
+    def calculate_carbon_score_uncertainty(self, projects, n_samples=1000, seed=42, chunk_size=1000,
+                                           percentiles=(5, 50, 95)):
+        """Percentiles du score et probabilités de catégorie pour tous les projets"""
+        chunks = list(self.iter_carbon_score_uncertainty(projects, n_samples, seed, chunk_size, percentiles))
+        if not chunks:
+            return {}
+        result = {
+            key: np.concatenate([chunk[key] for chunk in chunks])
+            for key in chunks[0] if key not in ('category_probabilities', 'factors_version')
+        }
+        result['factors_version'] = chunks[0]['factors_version']
+        result['category_probabilities'] = {
+            category: np.concatenate([chunk['category_probabilities'][category] for chunk in chunks])
+            for category in CATEGORIES
+        }
+        return result
+    
+    @staticmethod
+    def _iter_chunks(projects, chunk_size):
+        """Découpe un lot (DataFrame, liste ou itérable de projets) en morceaux de chunk_size"""
+        if hasattr(projects, 'iloc'):
+            for start in range(0, len(projects), chunk_size):
+                yield projects.iloc[start:start + chunk_size]
+            return
+        iterator = iter(projects)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
     
     def get_carbon_category(self, score):
         """Détermine la catégorie basée sur le score"""
@@ -83,21 +293,22 @@ class CarbonScorer:
             return "Très polluant"
     
     def get_impact_factors(self, project_data):
-        """Retourne les facteurs d'impact les plus importants"""
+        """Retourne les composantes pondérées du score carbone par catégorie"""
         factors = {}
+        emission_factors = self._factors
         
-        # Calcul des scores individuels
-        factors['Énergie'] = self.energy_factors.get(project_data.get('energie', 'mix'), 0.5) * 25
+        # Énergie 25%, transport 20%, matériaux 15%, secteur 20%, équipe 10%, durée de vie 10%
+        factors['Énergie'] = emission_factors.factor('energy', project_data.get('energie', 'mix')) * 25
         
-        transport_type_score = self.transport_factors.get(project_data.get('transport_type', 'routier'), 0.8)
+        transport_type_score = emission_factors.factor('transport', project_data.get('transport_type', 'routier'))
         distance = project_data.get('distance', 1000) / 10000
-        frequency_score = self.frequency_factors.get(project_data.get('frequency', 'mensuelle'), 0.5)
+        frequency_score = emission_factors.factor('frequency', project_data.get('frequency', 'mensuelle'))
         factors['Transport'] = (transport_type_score * distance * frequency_score) * 20
         
         materials = project_data.get('materials', 'plastique').split(', ')
-        factors['Matériaux'] = np.mean([self.material_factors.get(mat.strip(), 0.5) for mat in materials]) * 15
+        factors['Matériaux'] = np.mean([emission_factors.factor('material', mat.strip()) for mat in materials]) * 15
         
-        factors['Secteur'] = self.sector_factors.get(project_data.get('sector', 'Production industrielle'), 1.0) * 20
+        factors['Secteur'] = emission_factors.factor('sector', project_data.get('sector', 'Production industrielle')) * 20
         
         team_size = project_data.get('team_size', 50) / 500
         factors['Équipe'] = min(team_size, 1.0) * 10
@@ -112,18 +323,13 @@ class CarbonScorer:
         # Score environnemental (basé sur le score carbone inversé)
         env_score = 100 - carbon_score
         
+        factors = self._factors
+        
         # Score social (basé sur le secteur et la taille de l'équipe)
-        social_factors = {
-            'Agriculture durable': 80,
-            'Projets numériques': 70,
-            'Construction immobilière': 60,
-            'Transport / logistique': 50,
-            'Production industrielle': 40
-        }
-        social_score = social_factors.get(project_data.get('sector', 'Production industrielle'), 50)
+        social_score = factors.social.get(project_data.get('sector', 'Production industrielle'), factors.defaults.get('social', 50))
         
         # Score de gouvernance (score fixe pour simplification)
-        governance_score = 70
+        governance_score = factors.governance
         
         # Score ESG global (pondéré)
         esg_score = (env_score * 0.4 + social_score * 0.3 + governance_score * 0.3)
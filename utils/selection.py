@@ -0,0 +1,218 @@
+import numpy as np
+from utils.scoring_utils import CarbonScorer
+
+BUDGET_COLUMN = 'Budget carbone estimé (tCO2e)'
+NAME_COLUMN = 'Nom du projet'
+OBJECTIVES = ('esg', 'count')
+METHODS = ('auto', 'greedy', 'exact')
+
+
+class PortfolioSelector:
+    """Sélection des projets à financer sous un plafond d'émissions (tCO2e)
+
+    Problème du sac à dos : maximiser la somme des valeurs (score ESG ou nombre de projets
+    financés) sous la contrainte Σ tCO2e <= budget. La méthode gloutonne trie par valeur
+    par tCO2e et fournit une borne supérieure (relaxation continue de Dantzig) ; la méthode
+    exacte (séparation-évaluation avec la même borne) est réservée aux petites instances.
+    """
+
+    def __init__(self, scorer=None, exact_max_candidates=200, max_nodes=1_000_000):
+        self.scorer = scorer or CarbonScorer()
+        self.exact_max_candidates = exact_max_candidates
+        self.max_nodes = max_nodes
+
+    def candidates_from_dataframe(self, df):
+        """Tableaux des candidats (noms, tCO2e, scores carbone et ESG) d'un DataFrame du dataset"""
+        carbon_scores = self.scorer.calculate_carbon_scores(df)
+        return {
+            'names': df[NAME_COLUMN].to_numpy() if NAME_COLUMN in df.columns else df.index.to_numpy(),
+            'tco2e': df[BUDGET_COLUMN].to_numpy(dtype=np.float64),
+            'carbon_score': carbon_scores,
+            'esg_score': self.scorer.calculate_esg_scores(df, carbon_scores)
+        }
+
+    def select_from_dataframe(self, df, carbon_budget, objective='esg', method='auto'):
+        """Sélectionne les projets d'un DataFrame du dataset sous le plafond carbon_budget"""
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Objectif inconnu : {objective} (attendu : {', '.join(OBJECTIVES)})")
+        scorer = self.scorer.snapshot()
+        candidates = PortfolioSelector(scorer).candidates_from_dataframe(df)
+        values = candidates['esg_score'] if objective == 'esg' else np.ones(len(df))
+        result = self.select(candidates['tco2e'], values, carbon_budget, method=method)
+        result['names'] = candidates['names'][result['selected']]
+        result['objective'] = objective
+        result['candidates'] = candidates
+        result['factors_version'] = scorer.factors_version
+        return result
+
+    def select(self, tco2e, values, carbon_budget, method='auto'):
+        """Résout le problème pour des tableaux de coûts (tCO2e) et de valeurs"""
+        if method not in METHODS:
+            raise ValueError(f"Méthode inconnue : {method} (attendu : {', '.join(METHODS)})")
+        tco2e = np.asarray(tco2e, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if tco2e.shape != values.shape:
+            raise ValueError("tco2e et values doivent avoir la même taille")
+        if np.any(tco2e < 0) or carbon_budget < 0:
+            raise ValueError("Les budgets carbone doivent être positifs")
+
+        # Projets sans émission et de valeur positive : toujours retenus ; projets inutiles ou hors budget : exclus
+        free = (tco2e == 0) & (values > 0)
+        eligible = np.flatnonzero((tco2e > 0) & (tco2e <= carbon_budget) & (values > 0))
+        # Tri par valeur par tCO2e décroissante (stable : ordre d'origine en cas d'égalité)
+        order = eligible[np.argsort(-(values[eligible] / tco2e[eligible]), kind='stable')]
+        weights, gains = tco2e[order], values[order]
+
+        chosen, upper_bound, critical = self._greedy(weights, gains, carbon_budget)
+        optimal = critical is None or gains[chosen].sum() >= upper_bound - 1e-9 * max(1.0, upper_bound)
+        used_method = 'greedy'
+        if method == 'exact' or (method == 'auto' and not optimal and len(order) <= self.exact_max_candidates):
+            chosen, optimal = self._branch_and_bound(weights, gains, carbon_budget, chosen)
+            used_method = 'exact'
+
+        mask = free.copy()
+        mask[order[chosen]] = True
+        selected = np.flatnonzero(mask)
+        value = float(values[selected].sum())
+        free_value = float(values[free].sum())
+        return {
+            'selected': selected,
+            'mask': mask,
+            'value': value,
+            'tco2e': float(tco2e[selected].sum()),
+            'carbon_budget': float(carbon_budget),
+            'upper_bound': max(upper_bound + free_value, value),
+            'optimal': optimal,
+            'method': used_method,
+            # Valeur marginale d'une tCO2e supplémentaire (ratio de l'élément critique)
+            'shadow_price': float(gains[critical] / weights[critical]) if critical is not None else 0.0
+        }
+
+    @staticmethod
+    def _greedy(weights, gains, capacity):
+        """Glouton par ratio décroissant, complété par les éléments qui tiennent encore
+
+        Retourne (masque choisi, borne supérieure de Dantzig, indice de l'élément critique).
+        """
+        n = len(weights)
+        chosen = np.zeros(n, dtype=bool)
+        if n == 0:
+            return chosen, 0.0, None
+
+        cumulative = np.cumsum(weights)
+        critical = int(np.searchsorted(cumulative, capacity, side='right'))
+        chosen[:critical] = True
+        if critical == n:
+            return chosen, float(gains.sum()), None
+
+        used = cumulative[critical - 1] if critical > 0 else 0.0
+        upper_bound = float(gains[:critical].sum() + gains[critical] * (capacity - used) / weights[critical])
+
+        # Complète avec les éléments suivants qui tiennent dans la capacité restante
+        remaining = capacity - used
+        suffix_min = np.minimum.accumulate(weights[::-1])[::-1]
+        for i in range(critical + 1, n):
+            if suffix_min[i] > remaining:
+                break
+            if weights[i] <= remaining:
+                chosen[i] = True
+                remaining -= weights[i]
+
+        # Garantie 1/2 : le meilleur projet seul si il vaut plus que la solution gloutonne
+        best_single = int(np.argmax(gains))
+        if gains[best_single] > gains[chosen].sum():
+            chosen[:] = False
+            chosen[best_single] = True
+        return chosen, upper_bound, critical
+
+    def _branch_and_bound(self, weights, gains, capacity, incumbent):
+        """Séparation-évaluation exacte (borne de Dantzig), éléments triés par ratio décroissant
+
+        Retourne (masque optimal, optimalité prouvée) ; au-delà de max_nodes la meilleure
+        solution trouvée est retournée.
+        """
+        n = len(weights)
+        cumulative_weights = np.concatenate([[0.0], np.cumsum(weights)])
+        cumulative_gains = np.concatenate([[0.0], np.cumsum(gains)])
+        tolerance = 1e-9 * max(1.0, float(gains.sum()))
+
+        def bound(i, remaining):
+            # Éléments i..j-1 entiers, puis fraction de l'élément j
+            j = int(np.searchsorted(cumulative_weights, cumulative_weights[i] + remaining, side='right')) - 1
+            value = cumulative_gains[j] - cumulative_gains[i]
+            if j < n:
+                value += gains[j] * (remaining - (cumulative_weights[j] - cumulative_weights[i])) / weights[j]
+            return value
+
+        best_value = float(gains[incumbent].sum())
+        best_path = None
+        # Pile : (indice, capacité restante, valeur, chemin chaîné (élément, parent))
+        stack = [(0, capacity, 0.0, None)]
+        nodes = 0
+        while stack:
+            nodes += 1
+            if nodes > self.max_nodes:
+                break
+            i, remaining, value, path = stack.pop()
+            if value > best_value + tolerance:
+                best_value, best_path = value, path
+            if i == n or value + bound(i, remaining) <= best_value + tolerance:
+                continue
+            stack.append((i + 1, remaining, value, path))
+            if weights[i] <= remaining:
+                stack.append((i + 1, remaining - weights[i], value + gains[i], (i, path)))
+
+        if best_path is None:
+            return incumbent, nodes <= self.max_nodes
+        chosen = np.zeros(n, dtype=bool)
+        while best_path is not None:
+            chosen[best_path[0]] = True
+            best_path = best_path[1]
+        return chosen, nodes <= self.max_nodes
+
+    @staticmethod
+    def explain(result, top=10):
+        """Explication de la sélection : valeur marginale par tCO2e autour du seuil de coupure
+
+        Retourne un résumé et un DataFrame des derniers projets retenus et des premiers
+        projets écartés, classés par valeur ESG par tCO2e.
+        """
+        import pandas as pd
+
+        candidates = result['candidates']
+        values = candidates['esg_score'] if result['objective'] == 'esg' else np.ones(len(candidates['tco2e']))
+        tco2e = candidates['tco2e']
+        safe_tco2e = np.where(tco2e > 0, tco2e, 1.0)
+
+        frame = pd.DataFrame({
+            'project': candidates['names'],
+            'tco2e': tco2e,
+            'esg_score': candidates['esg_score'],
+            'carbon_score': candidates['carbon_score'],
+            'esg_per_tco2e': np.where(tco2e > 0, candidates['esg_score'] / safe_tco2e, np.inf),
+            'value_per_tco2e': np.where(tco2e > 0, values / safe_tco2e, np.inf),
+            'selected': result['mask']
+        })
+        frame = frame.sort_values('value_per_tco2e', ascending=False, kind='stable')
+        marginal = pd.concat([
+            frame[frame['selected']].tail(top),
+            frame[~frame['selected']].head(top)
+        ])
+
+        selected = result['mask']
+        summary = {
+            'objective': result['objective'],
+            'method': result['method'],
+            'optimal': result['optimal'],
+            'n_selected': int(selected.sum()),
+            'n_candidates': len(selected),
+            'value': result['value'],
+            'upper_bound': result['upper_bound'],
+            'gap': (result['upper_bound'] - result['value']) / result['upper_bound'] if result['upper_bound'] > 0 else 0.0,
+            'tco2e': result['tco2e'],
+            'budget_utilisation': result['tco2e'] / result['carbon_budget'] if result['carbon_budget'] > 0 else 0.0,
+            'esg_total': float(candidates['esg_score'][selected].sum()),
+            'esg_per_tco2e': float(candidates['esg_score'][selected].sum() / result['tco2e']) if result['tco2e'] > 0 else 0.0,
+            'shadow_price': result['shadow_price']
+        }
+        return {'summary': summary, 'marginal': marginal.reset_index(drop=True)}
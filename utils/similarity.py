@@ -0,0 +1,146 @@
+import os
+import pickle
+import numpy as np
+from utils.schema import CATEGORICAL_COLUMNS
+
+MATERIALS_COLUMN = 'Matériaux'
+
+
+class SimilarProjectsIndex:
+    """Index des plus proches voisins sur l'espace des features encodées
+
+    Les variables numériques sont standardisées ; les variables catégorielles sont encodées
+    en one-hot (les matériaux en multi-hot sur les matériaux de base) et pondérées de façon
+    à ce que deux modalités différentes soient à distance `categorical_weight`.
+    Les projets ajoutés après la construction sont conservés dans un tampon parcouru
+    exhaustivement, puis intégrés à l'arbre lorsque le tampon dépasse `rebuild_threshold`.
+    """
+
+    def __init__(self, categorical_weight=1.0, leaf_size=40, rebuild_threshold=1024):
+        self.categorical_weight = categorical_weight
+        self.leaf_size = leaf_size
+        self.rebuild_threshold = rebuild_threshold
+        self.feature_names = []
+        self.tree = None
+        self._points = None
+        self._buffer = []
+        self.names = []
+        self.budgets = []
+
+    def _fit_transform_params(self, X, feature_names, vocabularies):
+        """Calcule les paramètres de projection (moyennes, écarts-types, tables one-hot)"""
+        self.feature_names = list(feature_names)
+        self._numeric = [j for j, name in enumerate(self.feature_names) if name not in CATEGORICAL_COLUMNS]
+        self._mean = X[:, self._numeric].mean(axis=0)
+        std = X[:, self._numeric].std(axis=0)
+        self._std = np.where(std > 0, std, 1.0)
+
+        # Table code -> vecteur pour chaque variable catégorielle
+        hot_value = self.categorical_weight / np.sqrt(2)
+        self._categorical = []
+        for j, name in enumerate(self.feature_names):
+            if name not in CATEGORICAL_COLUMNS:
+                continue
+            values = vocabularies.get(name, [])
+            if name == MATERIALS_COLUMN:
+                base_materials = sorted({m.strip() for value in values for m in str(value).split(',')})
+                table = np.zeros((len(values), len(base_materials)))
+                for code, value in enumerate(values):
+                    for material in str(value).split(','):
+                        table[code, base_materials.index(material.strip())] = 1.0
+                norms = np.linalg.norm(table, axis=1, keepdims=True)
+                table = table / np.where(norms > 0, norms, 1.0) * hot_value
+            else:
+                table = np.eye(len(values)) * hot_value
+            self._categorical.append((j, table))
+
+    def transform(self, X):
+        """Projette des features encodées (sortie de prepare_features) dans l'espace de l'index"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        blocks = [(X[:, self._numeric] - self._mean) / self._std]
+        for j, table in self._categorical:
+            codes = X[:, j].astype(np.int64)
+            known = (codes >= 0) & (codes < len(table))
+            block = np.zeros((len(X), table.shape[1]))
+            # Les modalités ajoutées après la construction restent à mi-distance de toutes les autres
+            block[known] = table[codes[known]]
+            blocks.append(block)
+        return np.hstack(blocks)
+
+    def build(self, X, feature_names, vocabularies, names, budgets):
+        """Construit l'index à partir des features encodées des projets historiques"""
+        from sklearn.neighbors import KDTree
+
+        X = np.asarray(X, dtype=np.float64)
+        self._fit_transform_params(X, feature_names, vocabularies)
+        self._points = self.transform(X)
+        self.tree = KDTree(self._points, leaf_size=self.leaf_size)
+        self._buffer = []
+        self.names = list(names)
+        self.budgets = list(budgets)
+        return self
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, X, names, budgets):
+        """Ajoute des projets sans reconstruire l'arbre (tampon)"""
+        self._buffer.extend(self.transform(X))
+        self.names.extend(names)
+        self.budgets.extend(budgets)
+        if len(self._buffer) >= self.rebuild_threshold:
+            self._rebuild()
+
+    def _rebuild(self):
+        from sklearn.neighbors import KDTree
+
+        self._points = np.vstack([self._points, np.array(self._buffer)])
+        self.tree = KDTree(self._points, leaf_size=self.leaf_size)
+        self._buffer = []
+
+    def query(self, X, k=5):
+        """Retourne (distances, indices) des k plus proches voisins de chaque projet"""
+        if self.tree is None:
+            raise ValueError("L'index n'est pas construit")
+
+        points = self.transform(X)
+        k_tree = min(k, len(self._points))
+        distances, indices = self.tree.query(points, k=k_tree)
+
+        if self._buffer:
+            # Fusionne avec une recherche exhaustive dans le tampon
+            buffer = np.array(self._buffer)
+            buffer_distances = np.sqrt(((points[:, None, :] - buffer[None, :, :]) ** 2).sum(axis=2))
+            distances = np.hstack([distances, buffer_distances])
+            indices = np.hstack([indices, np.broadcast_to(len(self._points) + np.arange(len(buffer)), buffer_distances.shape)])
+            order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+
+        return distances, indices
+
+    def neighbours(self, X, k=5):
+        """Retourne pour chaque projet la liste de ses voisins (nom, budget carbone, distance)"""
+        distances, indices = self.query(X, k=k)
+        return [
+            [
+                {'name': self.names[i], 'carbon_budget': self.budgets[i], 'distance': float(d)}
+                for d, i in zip(row_distances, row_indices)
+            ]
+            for row_distances, row_indices in zip(distances, indices)
+        ]
+
+    def save(self, filepath):
+        """Sauvegarde l'index"""
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(filepath):
+        """Charge un index sauvegardé (None si le fichier n'existe pas)"""
+        try:
+            with open(filepath, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
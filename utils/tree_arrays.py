@@ -0,0 +1,97 @@
+import json
+import numpy as np
+
+TREE_FIELDS = ['children_left', 'children_right', 'feature', 'threshold', 'value', 'n_node_samples']
+
+
+class TreeArrays:
+    """Représentation NumPy d'un arbre de décision entraîné (sans dépendance à sklearn)"""
+
+    def __init__(self, children_left, children_right, feature, threshold, value, n_node_samples, classes):
+        self.children_left = np.asarray(children_left, dtype=np.int64)
+        self.children_right = np.asarray(children_right, dtype=np.int64)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        # Probabilités de classe par nœud (n_nodes, n_classes)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.n_node_samples = np.asarray(n_node_samples, dtype=np.int64)
+        self.classes = np.asarray(classes)
+        self.is_leaf = self.children_left < 0
+
+    @classmethod
+    def from_sklearn(cls, model, classes=None):
+        """Construit les tableaux à partir d'un DecisionTreeClassifier entraîné"""
+        tree = model.tree_
+        value = tree.value[:, 0, :]
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12)
+        return cls(
+            tree.children_left, tree.children_right, tree.feature, tree.threshold,
+            value, tree.n_node_samples, model.classes_ if classes is None else classes
+        )
+
+    @property
+    def node_count(self):
+        return len(self.children_left)
+
+    def apply(self, X):
+        """Retourne l'indice de la feuille atteinte par chaque échantillon"""
+        # sklearn compare les entrées converties en float32 aux seuils : même arrondi ici
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        nodes = np.zeros(len(X), dtype=np.int64)
+        active = np.arange(len(X))
+        # Descente vectorisée niveau par niveau
+        while active.size:
+            current = nodes[active]
+            internal = ~self.is_leaf[current]
+            active, current = active[internal], current[internal]
+            if not active.size:
+                break
+            go_left = X[active, self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.children_left[current], self.children_right[current])
+        return nodes
+
+    def predict_proba(self, X):
+        """Retourne les probabilités de classe"""
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        """Retourne la classe prédite"""
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    def to_arrays(self, prefix=''):
+        """Sérialise l'arbre en dictionnaire de tableaux (pour np.savez)"""
+        arrays = {prefix + field: getattr(self, field) for field in TREE_FIELDS}
+        arrays[prefix + 'classes'] = self.classes.astype(str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=''):
+        """Reconstruit l'arbre à partir des tableaux sérialisés"""
+        return cls(*(arrays[prefix + field] for field in TREE_FIELDS), arrays[prefix + 'classes'])
+
+
+def save_inference_artifacts(filepath, trees, feature_names, vocabularies, weights=None):
+    """Sauvegarde les arbres et les vocabulaires d'encodage dans un fichier .npz"""
+    weights = np.ones(len(trees)) if weights is None else np.asarray(weights, dtype=np.float64)
+    arrays = {
+        'n_trees': np.array(len(trees)),
+        'tree_weights': weights,
+        'feature_names': np.array(feature_names, dtype=str),
+        # Vocabulaires sérialisés en JSON : pas de pickle au chargement
+        'vocabularies': np.array(json.dumps(vocabularies, ensure_ascii=False))
+    }
+    for i, tree in enumerate(trees):
+        arrays.update(tree.to_arrays(prefix=f'tree_{i}_'))
+    np.savez(filepath, **arrays)
+
+
+def load_inference_artifacts(filepath):
+    """Charge les artefacts d'inférence sauvegardés par save_inference_artifacts"""
+    with np.load(filepath, allow_pickle=False) as arrays:
+        trees = [TreeArrays.from_arrays(arrays, prefix=f'tree_{i}_') for i in range(int(arrays['n_trees']))]
+        return {
+            'trees': trees,
+            'weights': arrays['tree_weights'],
+            'feature_names': arrays['feature_names'].tolist(),
+            'vocabularies': json.loads(str(arrays['vocabularies']))
+        }
@@ -0,0 +1,162 @@
+from math import factorial
+import numpy as np
+
+
+class TreeExplainer:
+    """Contributions exactes des features (valeurs de Shapley, variante TreeSHAP « path-dependent »)
+
+    Pour un arbre, la prédiction conditionnelle à un sous-ensemble S de features s'écrit
+    f_S(x) = Σ_feuilles v_l Π_{j ∈ U_l} (o_lj si j ∈ S, sinon z_lj), où U_l sont les features
+    du chemin de la feuille, z_lj le produit des ratios de couverture des séparations sur j
+    et o_lj = 1 si x respecte toutes ces séparations. La contribution d'une feuille ne dépend
+    donc que du motif binaire (o_lj)_j : elle est pré-calculée une fois pour les 2^|U_l| motifs
+    (en temps polynomial en |U_l| pour chaque motif), puis l'explication d'un lot
+    d'échantillons se réduit à quelques opérations vectorisées.
+    """
+
+    def __init__(self, trees, n_features, weights=None):
+        self.trees = list(trees)
+        weights = np.ones(len(self.trees)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.classes = self.trees[0].classes
+        # Largeur des entrées du modèle : les features jamais utilisées ont une contribution nulle
+        self.n_features = n_features
+        self._compiled = [self._compile_tree(tree) for tree in self.trees]
+        # Valeur de référence : espérance de la prédiction sur les données d'entraînement
+        self.expected_value = sum(weight * compiled['expected_value'] for weight, compiled in zip(self.weights, self._compiled))
+
+    def _class_columns(self, tree):
+        return np.searchsorted(self.classes, tree.classes)
+
+    def _compile_tree(self, tree):
+        """Pré-calcule les chemins de chaque feuille et les tables de contributions par motif"""
+        n_classes = len(self.classes)
+        covers = tree.n_node_samples.astype(np.float64)
+        values = np.zeros((tree.node_count, n_classes))
+        values[:, self._class_columns(tree)] = tree.value
+
+        split_nodes, split_is_left, split_slots = [], [], []
+        slot_features, slot_leaves, slot_positions, slot_offsets = [], [], [], []
+        leaf_values, leaf_covers, leaf_dims, tables = [], [], [], []
+        offset = 0
+
+        # Parcours en profondeur : (nœud, [(nœud parent, va à gauche)])
+        stack = [(0, [])]
+        while stack:
+            node, path = stack.pop()
+            if not tree.is_leaf[node]:
+                left, right = tree.children_left[node], tree.children_right[node]
+                stack.append((right, path + [(node, False, right)]))
+                stack.append((left, path + [(node, True, left)]))
+                continue
+
+            # Features distinctes du chemin, avec produit des ratios de couverture
+            features, z = [], []
+            for parent, is_left, child in path:
+                feature = int(tree.feature[parent])
+                if feature not in features:
+                    features.append(feature)
+                    z.append(1.0)
+                position = features.index(feature)
+                z[position] *= covers[child] / covers[parent]
+                split_nodes.append(parent)
+                split_is_left.append(is_left)
+                split_slots.append(len(slot_features) + position)
+
+            leaf_index = len(leaf_values)
+            d = len(features)
+            for position, feature in enumerate(features):
+                slot_features.append(feature)
+                slot_leaves.append(leaf_index)
+                slot_positions.append(position)
+                slot_offsets.append(offset)
+            leaf_values.append(values[node])
+            leaf_covers.append(covers[node])
+            leaf_dims.append(d)
+            table = self._contribution_table(np.array(z))
+            tables.append(table.ravel())
+            offset += table.size
+
+        n_slots = len(slot_features)
+        n_leaves = len(leaf_values)
+        slot_positions = np.array(slot_positions, dtype=np.int64)
+        slot_leaves = np.array(slot_leaves, dtype=np.int64)
+
+        # Séparations triées par emplacement (une feature d'une feuille) pour np.add.reduceat
+        split_order = np.argsort(np.array(split_slots, dtype=np.int64), kind='stable')
+        split_slots = np.array(split_slots, dtype=np.int64)[split_order]
+        slot_starts = np.searchsorted(split_slots, np.arange(n_slots))
+        # Les emplacements d'une feuille sont contigus
+        leaf_starts = np.searchsorted(slot_leaves, np.arange(n_leaves))
+
+        # Valeurs de feuille réparties par feature : (emplacements, features * classes)
+        leaf_values = np.array(leaf_values)
+        slot_outputs = np.zeros((n_slots, self.n_features, n_classes))
+        slot_outputs[np.arange(n_slots), slot_features] = leaf_values[slot_leaves]
+
+        leaf_probability = np.array(leaf_covers) / covers[0]
+        return {
+            'split_nodes': np.array(split_nodes, dtype=np.int64)[split_order],
+            'split_is_left': np.array(split_is_left, dtype=bool)[split_order],
+            'slot_starts': slot_starts,
+            'leaf_starts': leaf_starts,
+            'slot_bits': 2 ** slot_positions,
+            'slot_outputs': slot_outputs.reshape(n_slots, -1),
+            'slot_leaves': slot_leaves,
+            'slot_base': np.array(slot_offsets, dtype=np.int64) + slot_positions,
+            'slot_dims': np.array(leaf_dims, dtype=np.int64)[slot_leaves],
+            'tables': np.concatenate(tables) if tables else np.zeros(0),
+            'expected_value': leaf_probability @ leaf_values,
+            'tree': tree
+        }
+
+    @staticmethod
+    def _contribution_table(z):
+        """Coefficients C[motif, j] : contribution de la feature j pour chaque motif binaire"""
+        d = len(z)
+        if d == 0:
+            return np.zeros((1, 0))
+        patterns = np.arange(2 ** d)
+        on = ((patterns[:, None] >> np.arange(d)) & 1).astype(np.float64)
+        # Poids de Shapley pour |S| = s parmi d joueurs
+        shapley_weights = np.array([factorial(s) * factorial(d - s - 1) / factorial(d) for s in range(d)])
+
+        table = np.zeros((2 ** d, d))
+        for j in range(d):
+            # Polynôme générateur Π_{k≠j} (z_k + t·o_k) : coefficient de t^s = somme sur |S| = s
+            poly = np.zeros((2 ** d, d))
+            poly[:, 0] = 1.0
+            for k in range(d):
+                if k == j:
+                    continue
+                shifted = np.zeros_like(poly)
+                shifted[:, 1:] = poly[:, :-1]
+                poly = poly * z[k] + on[:, k:k + 1] * shifted
+            table[:, j] = (on[:, j] - z[j]) * (poly @ shapley_weights)
+        return table
+
+    def shap_values(self, X):
+        """Contributions (n_échantillons, n_features, n_classes) ; leur somme plus expected_value
+        donne les probabilités prédites"""
+        # Entrées arrondies en float32 comme dans sklearn (mêmes feuilles que predict_proba)
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        contributions = np.zeros((len(X), self.n_features, len(self.classes)))
+
+        for weight, compiled in zip(self.weights, self._compiled):
+            if not len(compiled['split_nodes']):
+                continue
+            tree = compiled['tree']
+            nodes = compiled['split_nodes']
+            goes_left = X[:, tree.feature[nodes]] <= tree.threshold[nodes]
+            # o = 1 si aucune séparation du chemin n'est violée pour cette feature
+            violations = np.add.reduceat(goes_left != compiled['split_is_left'], compiled['slot_starts'], axis=1)
+            on_path = violations == 0
+            # Motif binaire de chaque feuille
+            patterns = np.add.reduceat(on_path * compiled['slot_bits'], compiled['leaf_starts'], axis=1)
+
+            slot_patterns = patterns[:, compiled['slot_leaves']]
+            coefficients = compiled['tables'][compiled['slot_base'] + slot_patterns * compiled['slot_dims']]
+            # Somme par feature : (n, emplacements) x (emplacements, features * classes)
+            contributions += weight * (coefficients @ compiled['slot_outputs']).reshape(contributions.shape)
+
+        return contributions